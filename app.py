@@ -12,6 +12,151 @@ import random
 
 # Import functions.py
 from functions import *
+from filter_index import FilterIndex
+from schema import normalize_enriched, normalize_scanned
+from storage import load_table, save_table, to_csv_bytes
+from tracing import get_tracer
+
+
+# Read and clean a scanned menu once per file version; mtime is only part of the cache key
+@st.cache_data
+def load_scanned(path, mtime):
+    return normalize_scanned(load_table(path))
+
+
+# Colors for the scatter plot by main_type (red, white, rose, sparkling, orange, or other)
+COLOR_MAP = {
+    "red": "#7B1E26",
+    "white": "#F4E19C",
+    "sparkling": "#F7D07D",
+    "rose": "#E88E9B",
+    "orange": "#E07E39",
+    "other": "#808080",  # Default gray for unspecified types
+}
+
+
+def prettify_pairings(x):
+    # ["beef", "lamb and game"] -> "Beef, Lamb and Game"
+    if not isinstance(x, list):
+        return ""
+    return ", ".join(
+        " ".join(
+            (
+                word.capitalize()
+                if word.lower() not in ["and", "or", "etc"]
+                else word.lower()
+            )
+            for word in pairing.split()
+        )
+        for pairing in x
+    )
+
+
+# Read and prepare an enriched menu once per file version, ready for the dashboard
+@st.cache_data
+def load_enriched(path, mtime):
+    # Make sure menu_price, vivino_price, price_multiplier, num_ratings, and rating are floats, if not, set as 0
+    df = normalize_enriched(load_table(path))
+
+    # If there are no ids, remove the column
+    if "id" in df.columns and len(df["id"].unique()) <= 2:
+        df = df.drop(columns=["id"])
+
+    # Add color column by main_type
+    df["color"] = (
+        df["main_type"]
+        .astype(str)
+        .str.lower()
+        .map(lambda x: COLOR_MAP.get(x, COLOR_MAP["other"]))
+    )
+
+    # Make Food Pairings Prettier and move them to the last column
+    if "food_pairings" in df.columns:
+        df["food_pairings"] = df.pop("food_pairings").apply(prettify_pairings)
+
+    return df
+
+
+# Filtering index over an enriched menu, built once per file version and shared;
+# rewrites (e.g. fetching food pairings) make a new version, so only a few are kept
+@st.cache_resource(max_entries=4)
+def load_index(path, mtime):
+    return FilterIndex(load_enriched(path, mtime))
+
+
+# Wines matching the sidebar filters, memoized on the file version and filter state;
+# slider positions are continuous, so only the latest filter states are kept
+@st.cache_data(max_entries=32)
+def filter_wines(path, mtime, **filters):
+    """
+    Filter an enriched menu with the precomputed index
+
+    Args:
+        path (str): Path to the enriched menu
+        mtime (float): Modification time of the file, part of the cache key
+        filters: price and rating as (min, max) tuples, and sizes, wine_types,
+            grapes, countries and regions as tuples of values to keep; filters
+            left out are not applied
+
+    Returns:
+        pd.DataFrame: Matching wines
+    """
+    index = load_index(path, mtime)
+    return index.select(index.mask(**filters))
+
+
+def facet_pills(label, index, column, filters, key):
+    # Pills for the values left after the filters so far, labelled with their counts
+    if column not in index.codes:
+        return None
+    counts = index.counts(column, index.mask(**filters))
+    options = list(counts)
+    selected = st.sidebar.pills(
+        label,
+        options,
+        selection_mode="multi",
+        default=options,
+        format_func=lambda value: f"{'Unknown' if pd.isna(value) else value} ({counts[value]})",
+        key=key,
+    )
+    return tuple(selected)
+
+
+# Scatter plot of the filtered wines; building the spec is cheap once the cached
+# filter has run, and a new chart per run is never shared between sessions
+def scatter_chart(filtered_df, x_axis, y_axis):
+    # Add a scatter plot with tooltips showing wine details
+    return (
+        alt.Chart(filtered_df)
+        .mark_circle()
+        .encode(
+            x=alt.X(
+                x_axis, title=x_axis.replace("_", " ").title()
+            ),  # Need to make 0 to 5 for rating in the future
+            y=alt.Y(y_axis, title=y_axis.replace("_", " ").title()),
+            color=alt.Color("color", scale=None),
+            size=alt.Size(
+                "menu_price", scale=alt.Scale(range=[10, 300]), title="Menu Price"
+            ),  # Adjust size dynamically
+            tooltip=[
+                alt.Tooltip("producer", title="Producer"),
+                alt.Tooltip("name", title="Name"),
+                alt.Tooltip("type", title="Type"),
+                alt.Tooltip("region", title="Region"),
+                alt.Tooltip("vintage", title="Vintage"),
+                alt.Tooltip("rating", title="Rating"),
+                alt.Tooltip(
+                    "menu_price", title="Menu Price", format="$,.2f"
+                ),  # Format as currency
+            ]
+            + (
+                [alt.Tooltip("country", title="Country")]
+                if "country" in filtered_df.columns
+                else []
+            ),
+        )
+        .interactive()
+    )
 
 
 # Intro Page to upload the wine scan
@@ -45,12 +190,23 @@ def intro(upload_id, output_id):
         # Run the scan
         if st.button("Scan"):
             with st.spinner("Scanning..."):
+                # Show the wines as Gemini streams them in
+                found = st.empty()
+                streamed = []
+
+                def show_wine(wine):
+                    streamed.append(wine)
+                    found.dataframe(pd.DataFrame(streamed), hide_index=True)
+
                 # Call the function to scan the PDF and save the results
                 df = create_csv_menu(
                     f"./temp/uploads/{upload_id}.pdf",
-                    f"./temp/uploads/{upload_id}.csv",
+                    f"./temp/uploads/{upload_id}.parquet",
                     editor=False,
+                    on_wine=show_wine,
                 )
+                found.empty()
+                save_trace(upload_id)
                 st.success("Scan complete!")
 
             # Show the csv
@@ -58,24 +214,22 @@ def intro(upload_id, output_id):
             st.dataframe(df)
 
     # Offer to filter by wine type, size, or price
-    if os.path.exists(f"./temp/uploads/{upload_id}.csv"):
+    if os.path.exists(f"./temp/uploads/{upload_id}.parquet"):
         st.write(
             " ".join(
                 [
                     "Checking for ratings takes time. You can filter the data by wine type, size, or price now to save time.",
                     "Ideally, you should try to filter down to <30 wines to get the fastest results, but if you have the time you don't have to filter at all!",
-                    "Searches take about 3 seconds per wine, so if you have 100 wines it will take about 5 minutes minimum but can be longer if rates are limited.",
+                    "Searches run a few wines at a time at about 1 request to Vivino per second, and a wine takes one to three requests, so if you have 100 wines it will take about 2 minutes minimum but can be longer if rates are limited.",
                     "You will see the filters automatically update as you edit them (ex: you won't be able to select champagne if it is not in your price range)",
                     "Note: Once you click the button below, you will not be able to change the filters for the ratings.",
                 ]
             )
         )
-        scanned_df = pd.read_csv(f"./temp/uploads/{upload_id}.csv")
+        scan_path = f"./temp/uploads/{upload_id}.parquet"
+        scanned_df = load_scanned(scan_path, os.path.getmtime(scan_path))
 
         # Select Price
-        scanned_df["price"] = scanned_df["price"].apply(
-            lambda x: float(x) if x != "N/A" else 0
-        )
         # Get the max price
         max_price = scanned_df["price"].max()
         # Get the min price
@@ -97,7 +251,7 @@ def intro(upload_id, output_id):
         ]
 
         # Select Main Types
-        main_types = scanned_df["main_type"].unique()
+        main_types = scanned_df["main_type"].dropna().unique()
         main_types = [
             x for x in main_types if x != "N/A" and x != "" and x != " " and x != "nan"
         ]
@@ -119,7 +273,7 @@ def intro(upload_id, output_id):
         scanned_df = scanned_df[scanned_df["main_type"].isin(main_types_choice)]
 
         # Select Sizes
-        sizes = scanned_df["size"].unique()
+        sizes = scanned_df["size"].dropna().unique()
         sizes = [x for x in sizes if x != "N/A"]
         size_choice = st.pills(
             "Select Sizes", sizes, selection_mode="multi", default=sizes, key="sizes"
@@ -128,7 +282,7 @@ def intro(upload_id, output_id):
         scanned_df = scanned_df[scanned_df["size"].isin(size_choice)]
 
         # Filter by grape
-        grapes = scanned_df["type"].unique()
+        grapes = scanned_df["type"].dropna().unique()
         grapes = [
             x for x in grapes if x != "N/A" and x != "" and x != " " and x != "nan"
         ]
@@ -150,7 +304,8 @@ def intro(upload_id, output_id):
     if st.button("Get Ratings"):
 
         # Read data
-        df = pd.read_csv(f"./temp/uploads/{upload_id}.csv")
+        scan_path = f"./temp/uploads/{upload_id}.parquet"
+        df = load_scanned(scan_path, os.path.getmtime(scan_path))
 
         # Filter the data
         df = df[
@@ -163,13 +318,36 @@ def intro(upload_id, output_id):
         # Count entries and calculate estimated time
         entries = len(df)
         st.write(
-            f"Given {entries} entries, this will take at least {round((entries*3) / 60, 1)} minutes."
+            f"Given {entries} entries, this will take at least {round(entries / 60, 1)} minutes."
         )
         st.write("Feel free to go grab a drink while you wait!")
 
         with st.spinner("Getting ratings..."):
-            # Call the function to get the ratings
-            viv_df = vivino_search_all(df)
+            # Show per-wine progress and the rows found so far while the lookups run
+            progress_bar = st.progress(0.0, text="Searching Vivino...")
+            live_table = st.empty()
+            finished_rows = []
+
+            def update_progress(done, total, row):
+                progress_bar.progress(
+                    done / total, text=f"Searched {done} of {total} wines"
+                )
+                finished_rows.append(row)
+                live_df = pd.DataFrame(finished_rows)
+                live_df["food_pairings"] = live_df["food_pairings"].apply(
+                    prettify_pairings
+                )
+                live_table.dataframe(live_df)
+
+            # Call the function to get the ratings, saving rows as they finish
+            viv_df = vivino_search_all(
+                df,
+                progress=update_progress,
+                partial_path=f"./temp/outputs/{output_id}.partial.csv",
+                checkpoint=f"./temp/jobs/{upload_id}.jsonl",
+            )
+            live_table.empty()
+            save_trace(upload_id)
             st.success("Ratings complete!")
             st.balloons()
 
@@ -178,16 +356,16 @@ def intro(upload_id, output_id):
         display_df = viv_df.copy()
         # Make sure food pairings is a string
         display_df["food_pairings"] = display_df["food_pairings"].apply(
-            lambda x: str(x) if x != "N/A" else ""
+            prettify_pairings
         )
         print(viv_df)
         st.dataframe(display_df)
 
-        # Save the data to a csv
-        viv_df.to_csv(f"./temp/outputs/{output_id}.csv", index=False)
+        # Save the data for the post scan page
+        save_table(viv_df, f"./temp/outputs/{output_id}.parquet")
 
         # Give the option to download the csv to save time
-        output_csv = viv_df.to_csv(index=False).encode("utf-8")
+        output_csv = to_csv_bytes(viv_df)
 
         st.download_button(
             label="Download CSV if you want to skip this step next time",
@@ -201,25 +379,84 @@ def intro(upload_id, output_id):
         st.write("To go to post scan page, change the button on the left")
 
 
+# Keep the timing spans of a scan next to its other files
+def save_trace(upload_id):
+    if not os.path.exists("./temp/traces"):
+        os.makedirs("./temp/traces")
+    get_tracer().export_jsonl(f"./temp/traces/{upload_id}.jsonl")
+
+
+# Page showing where the time went in the scans run by this server
+def diagnostics():
+    tracer = get_tracer()
+    summary = tracer.summary()
+
+    st.write(
+        "Time spent in each stage of the scans run since the app started. "
+        "Stages run in parallel, so their totals can add up to more than the wall time."
+    )
+    if not summary:
+        st.write("Nothing has been traced yet. Run a scan first.")
+        return
+
+    summary_df = pd.DataFrame(summary).fillna(0)
+    st.bar_chart(summary_df.set_index("stage")["total_s"], horizontal=True)
+    st.dataframe(summary_df, use_container_width=True, hide_index=True)
+
+    # The slowest individual spans, with their details
+    spans = sorted(tracer.finished(), key=lambda span: span.seconds, reverse=True)
+    st.write("Slowest spans:")
+    st.dataframe(
+        pd.DataFrame([span.to_dict() for span in spans[:50]]).astype(
+            {"attrs": str, "counters": str}
+        ),
+        use_container_width=True,
+        hide_index=True,
+    )
+
+    st.download_button(
+        label="Download trace (JSON lines)",
+        data=tracer.to_jsonl(),
+        file_name="trace.jsonl",
+        mime="application/jsonl",
+        icon=":material/download:",
+    )
+    if st.button("Clear trace"):
+        tracer.clear()
+        st.rerun()
+
+
 # Page for after the wine scan is complete
-# @st.cache_data
 def post_scan(upload_id, output_id):
     upload = False
 
     # Check for if output was already made
-    if not os.path.exists(f"./temp/outputs/{output_id}.csv"):
+    if not os.path.exists(f"./temp/outputs/{output_id}.parquet"):
         st.write(
             "Please upload a PDF file and run the scan before going to this page. Or, upload a previous csv below"
         )
         uploaded_file = st.file_uploader("Choose a CSV file", type="csv")
         if uploaded_file is not None:
-            with open(f"./temp/uploads/{output_id}.csv", "wb") as f:
-                f.write(uploaded_file.getbuffer())
+            csv_path = f"./temp/uploads/{output_id}.csv"
+            data_path = f"./temp/uploads/{output_id}.parquet"
+
+            # Streamlit keeps the upload across reruns; only a new file is converted
+            with open(csv_path, "ab+") as f:
+                f.seek(0)
+                new_file = f.read() != uploaded_file.getvalue()
+            if new_file:
+                with open(csv_path, "wb") as f:
+                    f.write(uploaded_file.getbuffer())
+                if os.path.exists(data_path):
+                    os.remove(data_path)
             st.success("File uploaded successfully!")
             st.write("Checking compatibility...")
 
             # Make sure the columns are correct
-            df = pd.read_csv(f"./temp/uploads/{output_id}.csv")
+            if os.path.exists(data_path):
+                df = load_enriched(data_path, os.path.getmtime(data_path))
+            else:
+                df = load_table(csv_path)
 
             required_columns = {
                 "producer",
@@ -231,6 +468,10 @@ def post_scan(upload_id, output_id):
             if required_columns.issubset(df.columns):
                 st.success("File is compatible!")
                 upload = True
+
+                # Keep a typed copy so reruns read Parquet instead of parsing the CSV
+                if not os.path.exists(data_path):
+                    save_table(df, data_path)
             else:
                 st.error(
                     "File is not compatible! Please upload a file with the correct columns."
@@ -238,46 +479,24 @@ def post_scan(upload_id, output_id):
 
     else:
         # Load the data
-        df = pd.read_csv(f"./temp/outputs/{output_id}.csv")
-        print(df.columns)
+        data_path = f"./temp/outputs/{output_id}.parquet"
+        df = load_enriched(data_path, os.path.getmtime(data_path))
         upload = True
 
     # Don't start until the file is uploaded
     if upload:
-        # Make sure menu_price, vivino_price, price_multiplier, num_ratings, and rating are floats, if not, set as 0
-        df["menu_price"] = df["menu_price"].apply(
-            lambda x: float(x) if x != "N/A" else 0
-        )
-        df["vivino_price"] = df["vivino_price"].apply(
-            lambda x: float(x) if x != "N/A" else 0
-        )
-        df["price_multiplier"] = df["price_multiplier"].apply(
-            lambda x: float(x) if x != "N/A" else 0
-        )
-        df["num_ratings"] = df["num_ratings"].apply(
-            lambda x: float(x) if x != "N/A" else 0
-        )
+        # Food pairings need a second page per wine, so they are only fetched on request
+        if "link" in df.columns and st.sidebar.button("Fetch Food Pairings"):
+            with st.spinner("Fetching food pairings..."):
+                save_table(fetch_food_pairings(load_table(data_path)), data_path)
 
-        # Make sure rating is a float, if not, set as 0
-        ratings = []
-        for rating in df["rating"]:
-            if rating != "-" and rating != "N/A":
-                try:
-                    ratings.append(float(rating))
-                except:
-                    ratings.append(0)
-            else:
-                ratings.append(0)
-        df["rating"] = ratings
+        # Cleaned frame from the cache; a rewritten file has a new mtime and is read again
+        mtime = os.path.getmtime(data_path)
+        df = load_enriched(data_path, mtime)
 
         # Get columns
         columns = df.columns.tolist()
 
-        # If there are no ids, remove the column
-        if "id" in columns:
-            if len(df["id"].unique()) <= 2:
-                df = df.drop(columns=["id"])
-
         # Make a column map for the columns capitalized without _
         column_map = {}
         for column in columns:
@@ -304,6 +523,11 @@ def post_scan(upload_id, output_id):
         x_axis = x_axis.lower().replace(" ", "_")
         y_axis = y_axis.lower().replace(" ", "_")
 
+        # Each control narrows the options of the ones below it; pill options and
+        # counts come from the index, and the final filter state is the cache key
+        index = load_index(data_path, mtime)
+        filters = {}
+
         # Add a slider to filter by price
         price_slider = st.sidebar.slider(
             "Price",
@@ -312,159 +536,37 @@ def post_scan(upload_id, output_id):
             value=(0.0, max(df["menu_price"])),
             format="$%.0f",  # Formats values as $XX.XX
         )
-
-        # Filter df by price
-        df = df[
-            (df["menu_price"] >= price_slider[0])
-            & (df["menu_price"] <= price_slider[1])
-        ]
+        filters["price"] = tuple(price_slider)
 
         # Add a range slider to filter by rating, default is 0 to 5
         rating_slider = st.sidebar.slider(
             "Rating", min_value=0.0, max_value=5.0, value=(0.0, 5.0), format="%.1f"
         )
+        filters["rating"] = tuple(rating_slider)
 
-        # Filter df by rating
-        df = df[(df["rating"] >= rating_slider[0]) & (df["rating"] <= rating_slider[1])]
-
-        # Add pills to filter by size, default is all
-        size = st.sidebar.pills(
-            "Size",
-            df["size"].unique(),
-            selection_mode="multi",
-            default=df["size"].unique(),
-            key="size",
+        # Add pills to filter by size, main type, grape, country and region, default is all
+        filters["sizes"] = facet_pills("Size", index, "size", filters, "size")
+        filters["wine_types"] = facet_pills(
+            "Wine Type", index, "main_type", filters, "wine_type"
         )
-
-        # Filter df by size
-        df = df[df["size"].isin(size)]
-
-        # Add pills to filter by main type, default is all
-        wine_type = st.sidebar.pills(
-            "Wine Type",
-            df["main_type"].unique(),
-            selection_mode="multi",
-            default=df["main_type"].unique(),
-            key="wine_type",
+        grape = facet_pills("Grape Varietal", index, "type", filters, "grape")
+        filters["countries"] = facet_pills(
+            "Country", index, "country", filters, "country"
         )
-        # Filter df by main type
-        df = df[df["main_type"].isin(wine_type)]
+        filters["regions"] = facet_pills("Region", index, "region", filters, "region")
 
-        # Add pills to filter by grape, default is all
-        grape = st.sidebar.pills(
-            "Grape Varietal",
-            df["type"].unique(),
-            selection_mode="multi",
-            default=df["type"].unique(),
-            key="grape",
-        )
-
-        # Add pills to filter by country, default is all
-        if "country" in df.columns:
-            country = st.sidebar.pills(
-                "Country",
-                df["country"].unique(),
-                selection_mode="multi",
-                default=df["country"].unique(),
-                key="country",
-            )
-            # Filter df by country
-            df = df[df["country"].isin(country)]
-
-        # Add pills to filter by region, default is all
-        region = st.sidebar.pills(
-            "Region",
-            df["region"].unique(),
-            selection_mode="multi",
-            default=df["region"].unique(),
-            key="region",
-        )
-        # Filter df by region
-        df = df[df["region"].isin(region)]
+        # The grape filter applies to the results but does not narrow the other pills
+        filters["grapes"] = grape
+        filtered_df = filter_wines(data_path, mtime, **filters)
 
         # Main page, should fill the page with the filtered data
-        st.write(f"## {len(df)} wines found")
-
-        # Filter the data; should be repetitive but just in case
-        filtered_df = df[
-            (df["menu_price"] >= price_slider[0])
-            & (df["menu_price"] <= price_slider[1])
-            & (df["main_type"].isin(wine_type) if "main_type" in df.columns else True)
-            & (df["type"].isin(grape) if "type" in df.columns else True)
-            & (df["country"].isin(country) if "country" in df.columns else True)
-            & (df["region"].isin(region) if "region" in df.columns else True)
-            & (df["size"].isin(size) if "size" in df.columns else True)
-            & (df["rating"] >= rating_slider[0] if "rating" in df.columns else True)
-            & (df["rating"] <= rating_slider[1] if "rating" in df.columns else True)
-        ]
+        st.write(f"## {len(filtered_df)} wines found")
 
-        # Add color column to the filtered data by main_type (red, white, rose, sparkling, orange, or other)
-        color_map = {
-            "red": "#7B1E26",
-            "white": "#F4E19C",
-            "sparkling": "#F7D07D",
-            "rose": "#E88E9B",
-            "orange": "#E07E39",
-            "other": "#808080",  # Default gray for unspecified types
-        }
-
-        filtered_df["color"] = (
-            filtered_df["main_type"]
-            .str.lower()
-            .map(lambda x: color_map.get(x, color_map["other"]))
+        st.altair_chart(
+            scatter_chart(filtered_df, x_axis, y_axis),
+            use_container_width=True,
         )
 
-        # Add a scatter plot with tooltips showing wine details
-        chart = (
-            alt.Chart(filtered_df)
-            .mark_circle()
-            .encode(
-                x=alt.X(
-                    x_axis, title=x_axis.replace("_", " ").title()
-                ),  # Need to make 0 to 5 for rating in the future
-                y=alt.Y(y_axis, title=y_axis.replace("_", " ").title()),
-                color=alt.Color("color", scale=None),
-                size=alt.Size(
-                    "menu_price", scale=alt.Scale(range=[10, 300]), title="Menu Price"
-                ),  # Adjust size dynamically
-                tooltip=[
-                    alt.Tooltip("producer", title="Producer"),
-                    alt.Tooltip("name", title="Name"),
-                    alt.Tooltip("type", title="Type"),
-                    alt.Tooltip("region", title="Region"),
-                    alt.Tooltip("vintage", title="Vintage"),
-                    alt.Tooltip("rating", title="Rating"),
-                    alt.Tooltip(
-                        "menu_price", title="Menu Price", format="$,.2f"
-                    ),  # Format as currency
-                ]
-                + (
-                    [alt.Tooltip("country", title="Country")]
-                    if "country" in filtered_df.columns
-                    else []
-                ),
-            )
-            .interactive()
-        )
-
-        st.altair_chart(chart, use_container_width=True)
-
-        # Make Food Pairings Prettier and last column
-        filtered_df["food_pairings"] = filtered_df["food_pairings"].apply(
-            lambda x: " ".join(
-                (
-                    word.capitalize()
-                    if word.lower() not in ["and", "or", "etc"]
-                    else word.lower()
-                )
-                for word in x.replace("[", "").replace("]", "").replace("'", "").split()
-            )
-        )
-
-        # Move food pairings to the last column
-        food_pairings = filtered_df.pop("food_pairings")
-        filtered_df["food_pairings"] = food_pairings
-
         # Remove _ from the column names
         filtered_df.columns = filtered_df.columns.str.replace("_", " ")
 
@@ -490,13 +592,15 @@ def main():
     st.title("🍷 Wine Scanner")
 
     # Create a menu
-    menu = ["Intro", "Post Scan"]
+    menu = ["Intro", "Post Scan", "Diagnostics"]
     choice = st.sidebar.selectbox("Menu", menu)
 
     if choice == "Intro":
         intro(upload_id, output_id)
     elif choice == "Post Scan":
         post_scan(upload_id, output_id)
+    elif choice == "Diagnostics":
+        diagnostics()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,195 @@
+"""
+Scan a folder of wine list PDFs without Streamlit
+
+Usage:
+    python batch.py menus/ --output temp/batch
+    python batch.py menus/ --format parquet --menu-workers 2 --lookup-workers 8
+
+Each PDF goes through text extraction, Gemini parsing and Vivino enrichment.
+Menus are pipelined: while one menu is being enriched, the next is already being
+parsed. One file per menu is written to the output folder, plus summary.json and
+trace.jsonl with the timing of every stage.
+The Gemini key is read from --api-key, the GOOGLE_API_KEY environment variable,
+or config.env.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from dotenv import load_dotenv
+
+from functions import (
+    GeminiWineParser,
+    create_csv_menu,
+    extract_folder_text,
+    vivino_search_all,
+)
+from schema import normalize_scanned
+from storage import save_table
+from throttle import AdaptiveRateLimiter
+from tracing import get_tracer
+
+
+def scan_menu(pdf_path, output_dir, parser, args):
+    """Extract and parse one menu, returning the scanned DataFrame"""
+    stem = os.path.splitext(os.path.basename(pdf_path))[0]
+    return create_csv_menu(
+        pdf_path,
+        os.path.join(output_dir, f"{stem}_scan.{args.format}"),
+        max_workers=args.page_workers,
+        parser=parser,
+        # Scans run in threads next to each other; the folder is extracted up
+        # front instead (--extract-processes)
+        extract_processes=0,
+    )
+
+
+def enrich_menu(df, pdf_path, output_dir, limiter, args):
+    """Look up one scanned menu on Vivino and write its output file"""
+    stem = os.path.splitext(os.path.basename(pdf_path))[0]
+    # Same cleaning as the app: "$45" menu prices become numbers
+    viv_df = vivino_search_all(
+        normalize_scanned(df),
+        max_workers=args.lookup_workers,
+        checkpoint=os.path.join(output_dir, "jobs", f"{stem}.jsonl"),
+        limiter=limiter,
+    )
+    path = save_table(viv_df, os.path.join(output_dir, f"{stem}.{args.format}"))
+    return viv_df, path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("folder", help="Folder of wine list PDFs")
+    parser.add_argument("--output", default="./temp/batch", help="Output folder")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--api-key", help="Google API key for Gemini")
+    parser.add_argument(
+        "--menu-workers", type=int, default=2, help="Menus scanned at the same time"
+    )
+    parser.add_argument(
+        "--extract-processes",
+        type=int,
+        default=0,
+        help="Processes used to extract the folder's PDFs up front, one PDF per "
+        "process (default: extract each PDF in-process while scanning)",
+    )
+    parser.add_argument(
+        "--page-workers", type=int, default=4, help="Pages sent to Gemini at once"
+    )
+    parser.add_argument(
+        "--lookup-workers",
+        type=int,
+        default=4,
+        help="Vivino lookups in flight per menu",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=1.0,
+        help="Starting Vivino requests per second, shared across all menus",
+    )
+    parser.add_argument(
+        "--max-rate",
+        type=float,
+        default=8.0,
+        help="Highest request rate reached while Vivino keeps answering",
+    )
+    args = parser.parse_args()
+
+    load_dotenv(dotenv_path="config.env")
+    api_key = args.api_key or os.environ.get("GOOGLE_API_KEY")
+    if not api_key:
+        print("No Google API key: pass --api-key or set GOOGLE_API_KEY")
+        sys.exit(1)
+
+    pdf_paths = sorted(
+        os.path.join(args.folder, name)
+        for name in os.listdir(args.folder)
+        if name.lower().endswith(".pdf")
+    )
+    if not pdf_paths:
+        print(f"No PDFs found in {args.folder}")
+        sys.exit(1)
+
+    if not os.path.exists(args.output):
+        os.makedirs(args.output)
+
+    # Fill the PDF text cache before any scan threads start, so the process pool
+    # is never started next to running threads
+    if args.extract_processes > 1:
+        extracted = extract_folder_text(args.folder, processes=args.extract_processes)
+        print(f"Extracted {extracted} PDFs with {args.extract_processes} processes")
+
+    gemini = GeminiWineParser(api_key)
+
+    # One limiter for every menu so the total rate follows what Vivino tolerates
+    limiter = AdaptiveRateLimiter(
+        rate=args.rate, burst=args.lookup_workers, max_rate=args.max_rate
+    )
+
+    summary = {}
+    started = {}
+    scan_pool = ThreadPoolExecutor(max_workers=args.menu_workers)
+    enrich_pool = ThreadPoolExecutor(max_workers=args.menu_workers)
+    with scan_pool, enrich_pool:
+        # Stage 1: extraction and parsing
+        scans = {}
+        for pdf_path in pdf_paths:
+            started[pdf_path] = time.perf_counter()
+            future = scan_pool.submit(scan_menu, pdf_path, args.output, gemini, args)
+            scans[future] = pdf_path
+
+        # Stage 2: enrichment starts for each menu as soon as its scan is done
+        enrichments = {}
+        for future in as_completed(scans):
+            pdf_path = scans[future]
+            try:
+                df = future.result()
+            except Exception as e:
+                print(f"Error scanning {pdf_path}: {str(e)}")
+                summary[pdf_path] = {"status": "scan_failed", "error": str(e)}
+                continue
+            summary[pdf_path] = {"wines": len(df)}
+            enrichments[pdf_path] = enrich_pool.submit(
+                enrich_menu, df, pdf_path, args.output, limiter, args
+            )
+
+        for pdf_path, future in enrichments.items():
+            try:
+                viv_df, path = future.result()
+            except Exception as e:
+                print(f"Error enriching {pdf_path}: {str(e)}")
+                summary[pdf_path].update({"status": "enrich_failed", "error": str(e)})
+                continue
+            summary[pdf_path].update(
+                {
+                    "status": "ok",
+                    "output": path,
+                    "found": int((viv_df["link"] != "N/A").sum()),
+                    "seconds": round(time.perf_counter() - started[pdf_path], 1),
+                }
+            )
+
+    with open(os.path.join(args.output, "summary.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+
+    # Timing spans of every stage, to see where a slow run spent its time
+    get_tracer().export_jsonl(os.path.join(args.output, "trace.jsonl"))
+    for stage in get_tracer().summary():
+        print(
+            f"{stage['stage']:<22} {stage['calls']:>6} calls  "
+            f"{stage['total_s']:9.2f}s total  {stage['p95_ms']:9.1f}ms p95"
+        )
+
+    for pdf_path in pdf_paths:
+        result = summary.get(pdf_path, {})
+        print(f"{os.path.basename(pdf_path)}: {result}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,470 @@
+"""
+Offline benchmark for the scan and ratings pipeline
+
+Runs create_csv_menu and vivino_search_all end to end on the PDFs in menus/ with
+Gemini and Vivino replaced by local stand-ins, so no network or API quota is used.
+
+Usage:
+    python benchmarks/bench.py
+    python benchmarks/bench.py --menus menus/rake-wine.pdf --vivino-latency 0.3
+    python benchmarks/bench.py --cassettes benchmarks/cassettes --record
+
+Vivino responses are served by a local HTTP server. They come from recorded
+cassettes when --cassettes points at a folder holding them (written there with
+--record, which fetches the real site on a miss), and are generated otherwise.
+"""
+
+import argparse
+import contextlib
+import glob
+import hashlib
+import http.server
+import io
+import json
+import os
+import random
+import re
+import resource
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import requests
+
+import functions
+import http_client
+from functions import GeminiWineParser, create_csv_menu, vivino_search_all
+
+# Lines that end in a price, e.g. "Producer, "Wine" Grape 2021 Region, FRA 64"
+PRICED_LINE = re.compile(r"^(?P<wine>.+?)\s+\$?(?P<price>\d{2,4})\s*$")
+VINTAGE = re.compile(r"\b(19|20)\d{2}\b")
+
+
+class CpuTimer:
+    def __init__(self):
+        """Thread-safe accumulator of CPU time spent in wrapped calls"""
+        self.seconds = 0.0
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def wrap(self, func):
+        """Return func wrapped so its CPU time on the calling thread is counted"""
+
+        def timed(*args, **kwargs):
+            start = time.thread_time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                with self.lock:
+                    self.seconds += time.thread_time() - start
+                    self.calls += 1
+
+        return timed
+
+    def wrap_iter(self, func, **overrides):
+        """Like wrap, for generator functions; overrides are passed as keyword args"""
+
+        def timed(*args, **kwargs):
+            kwargs.update(overrides)
+            iterator = func(*args, **kwargs)
+            while True:
+                start = time.thread_time()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    with self.lock:
+                        self.seconds += time.thread_time() - start
+                yield item
+
+        return timed
+
+
+class FakeGeminiResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeGeminiModel:
+    def __init__(self, latency: float):
+        """
+        Stand-in for the Gemini model that turns priced lines into wines
+
+        Args:
+            latency (float): Seconds to wait before answering, like a real round-trip
+        """
+        self.latency = latency
+
+    def generate_content(self, prompt, generation_config=None, stream=False):
+        time.sleep(self.latency)
+
+        # Only the page text between the prompt markers is parsed
+        text = prompt.split("Text to parse:")[-1].split("Respond with only")[0]
+
+        wines = []
+        for line in text.splitlines():
+            match = PRICED_LINE.match(line.strip())
+            if not match:
+                continue
+            wine = match.group("wine")
+            producer, _, name = wine.partition(",")
+            vintage = VINTAGE.search(wine)
+            wines.append(
+                {
+                    "id": None,
+                    "producer": producer.strip(),
+                    "name": name.strip() or producer.strip(),
+                    "type": None,
+                    "main_type": "RED",
+                    "region": None,
+                    "country": None,
+                    "vintage": vintage.group(0) if vintage else None,
+                    "price": match.group("price"),
+                    "size": "bottle",
+                }
+            )
+
+        text = "```json\n" + json.dumps({"wines": wines}) + "\n```"
+        if stream:
+            # Stream the response in small pieces, like the SDK does
+            return [
+                FakeGeminiResponse(text[i : i + 64]) for i in range(0, len(text), 64)
+            ]
+        return FakeGeminiResponse(text)
+
+
+class FakeGeminiParser(GeminiWineParser):
+    def __init__(self, latency: float):
+        """GeminiWineParser wired to FakeGeminiModel, with no parse cache"""
+        self.model_name = "fake-gemini"
+        self.model = FakeGeminiModel(latency)
+        self.cache = False
+        self.stream = False
+
+
+def _synthetic_response(path, query, page_kb, html_share):
+    # Generate a plausible Vivino response for a request that has no cassette
+    seed = int(hashlib.sha1((path + json.dumps(query)).encode()).hexdigest(), 16)
+    rng = random.Random(seed)
+    words = " ".join(query.get("search_query", query.get("q", ["Wine"])))
+    wine_id = seed % 10_000_000
+    padding = "<div class='filler'>" + "x" * 1024 + "</div>"
+    filler = padding * page_kb
+
+    if path == "/api/explore/explore":
+        # Send a share of the wines down the HTML fallback
+        if rng.random() < html_share:
+            return "application/json", json.dumps({"explore_vintage": {"matches": []}})
+        match = {
+            "vintage": {
+                "year": 2019,
+                "wine": {
+                    "id": wine_id,
+                    "name": words,
+                    "winery": {"name": ""},
+                    "region": {"name": "Region", "country": {"name": "Country"}},
+                    "style": {"food": [{"name": "Beef"}, {"name": "Lamb"}]},
+                },
+                "statistics": {
+                    "ratings_average": round(rng.uniform(3.2, 4.6), 1),
+                    "ratings_count": rng.randint(20, 20000),
+                },
+            },
+            "price": {"amount": round(rng.uniform(10, 150), 2)},
+        }
+        return "application/json", json.dumps({"explore_vintage": {"matches": [match]}})
+
+    if path == "/search/wines":
+        card = f"""
+        <div class="card card-lg">
+          <a href="/w/{wine_id}"><span class="wine-card__name">{words}</span></a>
+          <div class="wine-card__region">
+            <a data-item-type="country">Country</a>
+            <a class="link-color-alt-grey">Region</a>
+          </div>
+          <div class="average__number">{round(rng.uniform(3.2, 4.6), 1)}</div>
+          <div class="text-micro">{rng.randint(20, 20000)} ratings</div>
+          <span class="wine-price-value">${round(rng.uniform(10, 150), 2)}</span>
+        </div>"""
+        return "text/html", f"<html><body>{filler}{card}</body></html>"
+
+    # Wine detail page
+    offers = json.dumps({"offers": {"price": round(rng.uniform(10, 150), 2)}})
+    foods = "".join(f'<a aria-label="{food}"></a>' for food in ["Beef", "Lamb"])
+    return (
+        "text/html",
+        f"""<html><head><script type="application/ld+json">{offers}</script></head>
+        <body>{filler}<div class="foodPairing__foodContainer--1bvxM">{foods}</div></body></html>""",
+    )
+
+
+def start_vivino_server(
+    latency, page_kb, html_share=0.0, cassettes=None, record=False, tolerated_rate=0.0
+):
+    """
+    Start a local stand-in for www.vivino.com on a free port
+
+    Args:
+        latency (float): Seconds added to every response
+        page_kb (int): Kilobytes of filler added to HTML pages, like real page weight
+        html_share (float): Share of explore API lookups that return no match
+        cassettes (str): Folder of recorded responses to serve when present
+        record (bool): Fetch and save real responses for requests with no cassette
+        tolerated_rate (float): Requests per second served before answering 429
+            with Retry-After, like Vivino does (default: never throttle)
+
+    Returns:
+        ThreadingHTTPServer: Running server; its port is server.server_port
+    """
+
+    recent = []
+    recent_lock = threading.Lock()
+
+    def throttled():
+        # Sliding one-second window of the requests served
+        with recent_lock:
+            now = time.monotonic()
+            recent[:] = [t for t in recent if now - t < 1.0]
+            if tolerated_rate and len(recent) >= tolerated_rate:
+                return True
+            recent.append(now)
+            return False
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency)
+            if throttled():
+                self.send_response(429)
+                self.send_header("Retry-After", "1")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            key = hashlib.sha1(self.path.encode()).hexdigest()
+            cassette = os.path.join(cassettes, key + ".json") if cassettes else None
+
+            if cassette and os.path.exists(cassette):
+                with open(cassette) as f:
+                    recorded = json.load(f)
+                content_type, body = recorded["content_type"], recorded["body"]
+            elif cassette and record:
+                real = requests.get(
+                    http_client.VIVINO_URL + self.path,
+                    headers=http_client.DEFAULT_HEADERS,
+                    timeout=30,
+                )
+                content_type = real.headers.get("Content-Type", "text/html")
+                body = real.text
+                with open(cassette, "w") as f:
+                    json.dump({"content_type": content_type, "body": body}, f)
+            else:
+                content_type, body = _synthetic_response(
+                    url.path, query, page_kb, html_share
+                )
+
+            payload = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    if cassettes and not os.path.exists(cassettes):
+        os.makedirs(cassettes)
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def run(args):
+    """Run the benchmark and return a dict of results"""
+    server = start_vivino_server(
+        args.vivino_latency,
+        args.page_kb,
+        args.html_share,
+        args.cassettes,
+        args.record,
+        args.tolerated_rate,
+    )
+    http_client.set_client(
+        http_client.HttpClient(
+            base_url=f"http://127.0.0.1:{server.server_port}", http2=False
+        )
+    )
+
+    # Wrap the stages we want CPU time for
+    pdf_timer = CpuTimer()
+    html_timer = CpuTimer()
+    latencies = []
+    latency_lock = threading.Lock()
+    original_search = functions.vivino_search
+
+    def timed_search(*a, **kw):
+        start = time.perf_counter()
+        try:
+            return original_search(*a, **kw)
+        finally:
+            with latency_lock:
+                latencies.append(time.perf_counter() - start)
+
+    # The PDF text cache is bypassed so extraction is measured every run
+    functions.iter_pdf_pages = pdf_timer.wrap_iter(
+        functions.iter_pdf_pages, cache=False
+    )
+    functions.parse_search_card = html_timer.wrap(functions.parse_search_card)
+    functions.parse_wine_page = html_timer.wrap(functions.parse_wine_page)
+    functions.vivino_search = timed_search
+
+    parser = FakeGeminiParser(args.gemini_latency)
+    menus = []
+    for pattern in args.menus:
+        menus.extend(sorted(glob.glob(pattern)))
+
+    results = {"menus": {}, "config": vars(args)}
+    total_wines = 0
+    scan_seconds = 0.0
+    ratings_seconds = 0.0
+    quiet = io.StringIO()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for pdf_path in menus:
+            csv_path = os.path.join(tmp, os.path.basename(pdf_path) + ".csv")
+
+            with contextlib.redirect_stdout(quiet), contextlib.redirect_stderr(quiet):
+                start = time.perf_counter()
+                df = create_csv_menu(
+                    pdf_path,
+                    csv_path,
+                    max_workers=args.page_workers,
+                    parser=parser,
+                    rules=None if args.rules else False,
+                )
+                scanned = time.perf_counter()
+                if args.max_wines:
+                    df = df.head(args.max_wines)
+                vivino_search_all(
+                    df,
+                    max_workers=args.workers,
+                    rate=args.rate,
+                    cache=False,
+                    catalog=False,
+                )
+                finished = time.perf_counter()
+
+            scan_seconds += scanned - start
+            ratings_seconds += finished - scanned
+            total_wines += len(df)
+            results["menus"][os.path.basename(pdf_path)] = {
+                "wines": len(df),
+                "scan_seconds": round(scanned - start, 3),
+                "ratings_seconds": round(finished - scanned, 3),
+            }
+            print(
+                f"{os.path.basename(pdf_path):<24} {len(df):>4} wines  "
+                f"scan {scanned - start:6.2f}s  ratings {finished - scanned:6.2f}s"
+            )
+
+    server.shutdown()
+
+    results["summary"] = {
+        "wines": total_wines,
+        "scan_seconds": round(scan_seconds, 3),
+        "ratings_seconds": round(ratings_seconds, 3),
+        "wines_per_second": (
+            round(total_wines / ratings_seconds, 2) if ratings_seconds else None
+        ),
+        "lookup_p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "lookup_p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "pdf_cpu_seconds": round(pdf_timer.seconds, 3),
+        "html_cpu_seconds": round(html_timer.seconds, 3),
+        "html_parses": html_timer.calls,
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        "peak_rss_mb": round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            / (1024 * 1024 if sys.platform == "darwin" else 1024),
+            1,
+        ),
+    }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument(
+        "--menus", nargs="+", default=["menus/*.pdf"], help="PDF files or globs"
+    )
+    parser.add_argument("--workers", type=int, default=4, help="Vivino lookup workers")
+    parser.add_argument(
+        "--page-workers", type=int, default=4, help="Gemini page workers"
+    )
+    parser.add_argument(
+        "--rate", type=float, default=1000.0, help="Vivino requests per second"
+    )
+    parser.add_argument(
+        "--vivino-latency", type=float, default=0.1, help="Seconds per Vivino response"
+    )
+    parser.add_argument(
+        "--gemini-latency", type=float, default=1.0, help="Seconds per Gemini request"
+    )
+    parser.add_argument(
+        "--page-kb", type=int, default=200, help="Filler KB added to HTML pages"
+    )
+    parser.add_argument(
+        "--html-share",
+        type=float,
+        default=0.25,
+        help="Share of wines the explore API misses, sent to the HTML fallback",
+    )
+    parser.add_argument(
+        "--max-wines", type=int, default=0, help="Only look up this many wines per menu"
+    )
+    parser.add_argument(
+        "--tolerated-rate",
+        type=float,
+        default=0.0,
+        help="Requests per second the stand-in serves before answering 429",
+    )
+    parser.add_argument(
+        "--rules",
+        action="store_true",
+        help="Parse well-structured pages locally and send only the rest to Gemini",
+    )
+    parser.add_argument("--cassettes", help="Folder of recorded Vivino responses")
+    parser.add_argument(
+        "--record", action="store_true", help="Record missing cassettes from vivino.com"
+    )
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = run(args)
+
+    print()
+    for name, value in results["summary"].items():
+        print(f"{name:<20} {value}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Benchmark Vivino HTML extraction against the full BeautifulSoup parse it replaced
+
+Usage:
+    python benchmarks/bench_html.py
+    python benchmarks/bench_html.py --cassettes benchmarks/cassettes
+    python benchmarks/bench_html.py --page-kb 400 --pages 100
+
+Pages come from the recorded cassettes written by bench.py --record when
+--cassettes is given, and are generated like bench.py's stand-in server otherwise.
+Both paths must return the same fields for every page; mismatches are reported.
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from bs4 import BeautifulSoup
+
+import html_extract
+from bench import _synthetic_response
+from html_extract import parse_search_card, parse_wine_page
+
+
+def legacy_search_card(html):
+    """The search page path before html_extract: whole page through html.parser"""
+    soup = BeautifulSoup(html, "html.parser")
+    first_result = soup.select_one(".card.card-lg")
+    if not first_result:
+        return None
+    try:
+        ratings = first_result.select_one(".text-micro")
+        rating = first_result.select_one(".average__number")
+        price = first_result.select_one(".wine-price-value")
+        return {
+            "name": first_result.select_one(".wine-card__name").text.strip(),
+            "link": "https://www.vivino.com" + first_result.select_one("a")["href"],
+            "country": first_result.select_one(
+                ".wine-card__region [data-item-type='country']"
+            ).text.strip(),
+            "region": first_result.select_one(
+                ".wine-card__region .link-color-alt-grey"
+            ).text.strip(),
+            "rating": rating.text.strip() if rating else "N/A",
+            "num_ratings": (
+                ratings.text.split(" ratings")[0].strip() if ratings else "N/A"
+            ),
+            "price": price.text.strip() if price else "N/A",
+        }
+    except AttributeError:
+        return None
+
+
+def legacy_wine_page(html):
+    """The wine page path before html_extract: whole page through html.parser"""
+    soup = BeautifulSoup(html, "html.parser")
+    container = soup.select_one(".foodPairing__foodContainer--1bvxM")
+    food_pairings = (
+        [a.get("aria-label") for a in container.find_all("a")] if container else []
+    )
+
+    price = "N/A"
+    try:
+        price = (
+            json.loads(soup.find("script", {"type": "application/ld+json"}).string)
+            .get("offers", {})
+            .get("price")
+        )
+        if price is None:
+            amount = soup.find("span", class_="purchaseAvailabilityPPC__amount--2_4GT")
+            price = amount.text.strip() if amount else "N/A"
+    except (AttributeError, TypeError, ValueError):
+        price = "N/A"
+    return {"food_pairings": food_pairings, "price": str(price)}
+
+
+def load_pages(args):
+    """Search pages and wine pages to parse, as two lists of HTML strings"""
+    search_pages, wine_pages = [], []
+
+    if args.cassettes:
+        for path in sorted(glob.glob(os.path.join(args.cassettes, "*.json"))):
+            with open(path) as f:
+                recorded = json.load(f)
+            if "html" not in recorded["content_type"]:
+                continue
+            if "card-lg" in recorded["body"]:
+                search_pages.append(recorded["body"])
+            else:
+                wine_pages.append(recorded["body"])
+        return search_pages, wine_pages
+
+    for i in range(args.pages):
+        query = {"q": [f"Wine {i}"]}
+        search_pages.append(
+            _synthetic_response("/search/wines", query, args.page_kb, 0.0)[1]
+        )
+        wine_pages.append(_synthetic_response(f"/w/{i}", query, args.page_kb, 0.0)[1])
+    return search_pages, wine_pages
+
+
+def time_parser(func, pages, repeat):
+    """Best CPU seconds per page over repeat passes, and the last pass's results"""
+    best = float("inf")
+    results = []
+    for _ in range(repeat):
+        start = time.process_time()
+        results = [func(page) for page in pages]
+        best = min(best, (time.process_time() - start) / max(len(pages), 1))
+    return best, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--cassettes", help="Folder of recorded Vivino responses")
+    parser.add_argument(
+        "--pages", type=int, default=50, help="Generated pages per kind"
+    )
+    parser.add_argument(
+        "--page-kb", type=int, default=200, help="Filler KB added to generated pages"
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="Timed passes per parser")
+    args = parser.parse_args()
+
+    search_pages, wine_pages = load_pages(args)
+    backend = "lxml" if html_extract.HAS_LXML else "BeautifulSoup (card only)"
+    print(
+        f"{len(search_pages)} search pages, {len(wine_pages)} wine pages, card parser: {backend}"
+    )
+
+    for kind, pages, legacy, fast in [
+        ("search", search_pages, legacy_search_card, parse_search_card),
+        ("wine", wine_pages, legacy_wine_page, parse_wine_page),
+    ]:
+        if not pages:
+            continue
+        legacy_seconds, expected = time_parser(legacy, pages, args.repeat)
+        fast_seconds, found = time_parser(fast, pages, args.repeat)
+        mismatches = sum(a != b for a, b in zip(expected, found))
+        print(
+            f"{kind:<7} legacy {legacy_seconds * 1000:8.2f} ms/page  "
+            f"html_extract {fast_seconds * 1000:8.3f} ms/page  "
+            f"speedup {legacy_seconds / fast_seconds:6.1f}x  mismatches {mismatches}"
+        )
+
+
+if __name__ == "__main__":
+    main()
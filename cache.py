@@ -0,0 +1,305 @@
+import copy
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+
+def normalize_text(value):
+    """
+    Fold a menu field for matching: lowercase, strip accents and punctuation, collapse spaces
+
+    Args:
+        value: Raw field value (may be None or NaN)
+
+    Returns:
+        str: Normalized text, empty string for missing values
+    """
+    if value is None or value != value:
+        return ""
+    text = unicodedata.normalize("NFKD", str(value))
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r"[^\w\s]", " ", text.lower())
+    return " ".join(text.split())
+
+
+def normalize_vintage(value):
+    """Turn vintages like 2019, "2019" and 2019.0 into the same string"""
+    text = normalize_text(value)
+    match = re.search(r"\b(1[89]|20)\d{2}\b", text)
+    return match.group(0) if match else ""
+
+
+def identity_key(producer, name, vintage):
+    """
+    Key for deciding that two menu rows are the same wine, ignoring region and size
+
+    Args:
+        producer (str): Producer from the menu
+        name (str): Wine name from the menu
+        vintage (str): Vintage from the menu
+
+    Returns:
+        str: Key combining the normalized fields
+    """
+    return "|".join(
+        [normalize_text(producer), normalize_text(name), normalize_vintage(vintage)]
+    )
+
+
+def wine_key(producer, name, vintage, region):
+    """
+    Build the normalized identity key used by the lookup cache
+
+    Args:
+        producer (str): Producer from the menu
+        name (str): Wine name from the menu
+        vintage (str): Vintage from the menu
+        region (str): Region from the menu
+
+    Returns:
+        str: Key combining the normalized fields
+    """
+    return "|".join(
+        [
+            normalize_text(producer),
+            normalize_text(name),
+            normalize_vintage(vintage),
+            normalize_text(region),
+        ]
+    )
+
+
+class LookupCache:
+    def __init__(
+        self,
+        path: str = "./temp/cache/vivino.sqlite",
+        ttl: float = 30 * 24 * 60 * 60,
+        max_entries: int = 20000,
+    ):
+        """
+        Persistent SQLite cache of parsed Vivino results
+
+        Args:
+            path (str): Location of the SQLite file
+            ttl (float): Seconds before an entry is considered stale (default: 30 days)
+            max_entries (int): Number of entries kept before the oldest are evicted
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+
+        # Make sure the cache folder exists
+        folder = os.path.dirname(path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+
+        # One connection shared by the lookup threads, guarded by the lock
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS lookups (
+                    key TEXT PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    created REAL NOT NULL
+                )
+                """)
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS lookups_created ON lookups (created)"
+            )
+
+    def get(self, key: str):
+        """Return the cached result dict for key, or None if missing or expired"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT data, created FROM lookups WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+
+        data, created = row
+        if time.time() - created > self.ttl:
+            return None
+        return json.loads(data)
+
+    def set(self, key: str, data: dict):
+        """Store a result dict and evict the oldest entries past max_entries"""
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO lookups (key, data, created) VALUES (?, ?, ?)",
+                (key, json.dumps(data), time.time()),
+            )
+            self.conn.execute(
+                """
+                DELETE FROM lookups WHERE key IN (
+                    SELECT key FROM lookups ORDER BY created DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,),
+            )
+
+    def purge_expired(self):
+        """Delete every entry older than the TTL"""
+        with self.lock, self.conn:
+            self.conn.execute(
+                "DELETE FROM lookups WHERE created < ?", (time.time() - self.ttl,)
+            )
+
+
+class ParseCache:
+    def __init__(
+        self,
+        path: str = "./temp/cache/gemini.sqlite",
+        max_memory_entries: int = 256,
+    ):
+        """
+        Cache of Gemini page parses, kept in an in-memory LRU backed by SQLite
+
+        Args:
+            path (str): Location of the SQLite file
+            max_memory_entries (int): Number of parses kept in memory
+        """
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+
+        # Make sure the cache folder exists
+        folder = os.path.dirname(path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS parses (
+                    key TEXT PRIMARY KEY,
+                    wines TEXT NOT NULL,
+                    created REAL NOT NULL
+                )
+                """)
+
+    @staticmethod
+    def make_key(text: str, prompt_version, model_name: str):
+        """Hash the page text together with the prompt version and model name"""
+        digest = hashlib.sha256()
+        for part in (str(prompt_version), model_name, text):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def _remember(self, key, wines):
+        # Move key to the most recently used end and drop the least recently used
+        self.memory[key] = wines
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_memory_entries:
+            self.memory.popitem(last=False)
+
+    def get(self, key: str):
+        """Return the cached list of wines for key, or None on a miss"""
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                return copy.deepcopy(self.memory[key])
+
+            row = self.conn.execute(
+                "SELECT wines FROM parses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            wines = json.loads(row[0])
+            self._remember(key, wines)
+            return copy.deepcopy(wines)
+
+    def set(self, key: str, wines: list):
+        """Store the parsed wines for key in memory and on disk"""
+        with self.lock, self.conn:
+            self._remember(key, copy.deepcopy(wines))
+            self.conn.execute(
+                "INSERT OR REPLACE INTO parses (key, wines, created) VALUES (?, ?, ?)",
+                (key, json.dumps(wines), time.time()),
+            )
+
+
+def file_hash(path: str):
+    """sha256 of a file's contents, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class PdfTextCache:
+    def __init__(self, path: str = "./temp/cache/pdf_text.sqlite"):
+        """
+        SQLite cache of extracted PDF page text keyed by file hash
+
+        Args:
+            path (str): Location of the SQLite file
+        """
+        self.path = path
+        self.lock = threading.Lock()
+
+        # Make sure the cache folder exists
+        folder = os.path.dirname(path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS pages (
+                    hash TEXT NOT NULL,
+                    page INTEGER NOT NULL,
+                    text TEXT NOT NULL,
+                    PRIMARY KEY (hash, page)
+                )
+                """)
+            # A PDF is only served from the cache once every page has been stored
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS documents (
+                    hash TEXT PRIMARY KEY,
+                    num_pages INTEGER NOT NULL,
+                    created REAL NOT NULL
+                )
+                """)
+
+    def num_pages(self, digest: str):
+        """Number of pages cached for a fully extracted PDF, or None"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT num_pages FROM documents WHERE hash = ?", (digest,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def get_page(self, digest: str, page: int):
+        """Cached text of one page, or None"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT text FROM pages WHERE hash = ? AND page = ?", (digest, page)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_page(self, digest: str, page: int, text: str):
+        """Store the text of one page"""
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO pages (hash, page, text) VALUES (?, ?, ?)",
+                (digest, page, text),
+            )
+
+    def mark_complete(self, digest: str, num_pages: int):
+        """Record that every page of the PDF has been stored"""
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO documents (hash, num_pages, created) VALUES (?, ?, ?)",
+                (digest, num_pages, time.time()),
+            )
@@ -0,0 +1,386 @@
+"""
+Local mirror of the Vivino catalog, matched before searching Vivino live
+
+Usage:
+    python catalog.py --countries fr it es us --types 1 2 3 4 --pages 40
+
+Wines are harvested by country and wine type through the explore endpoint (the
+same one get_vivino_data in tester.ipynb uses) and stored in a SQLite file with a
+full-text index over the winery and wine names. vivino_search_iter matches each
+menu row against it first and only searches Vivino live for the rows it misses.
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from cache import normalize_text, normalize_vintage
+from http_client import REQUEST_ERRORS, get_client
+from throttle import (
+    ERROR,
+    OK,
+    THROTTLED,
+    AdaptiveRateLimiter,
+    ServerError,
+    Throttled,
+    check_response,
+)
+from tracing import span
+
+EXPLORE_URL = "https://www.vivino.com/api/explore/explore"
+CATALOG_PATH = "./temp/cache/catalog.sqlite"
+
+# Vivino's wine_type_ids
+WINE_TYPES = {
+    1: "red",
+    2: "white",
+    3: "sparkling",
+    4: "rose",
+    7: "dessert",
+    24: "fortified",
+}
+
+
+def match_to_wine(match):
+    """
+    Turn one explore API match into the wine data returned by vivino_search
+
+    Args:
+        match (dict): Entry of explore_vintage.matches
+
+    Returns:
+        dict: name, link, country, region, rating, num_ratings, price and
+            food_pairings (no price_multiplier, which depends on the menu)
+    """
+    wine = match["vintage"]["wine"]
+    statistics = match["vintage"]["statistics"]
+    wine_year = match["vintage"].get("year")
+    link = f"https://www.vivino.com/w/{wine['id']}"
+    if wine_year:
+        link += f"?year={wine_year}"
+
+    style = wine.get("style") or {}
+    price = (match.get("price") or {}).get("amount")
+
+    return {
+        "name": f"{wine['winery']['name']} {wine['name']} {wine_year or ''}".strip(),
+        "link": link,
+        "country": wine["region"]["country"]["name"],
+        "region": wine["region"]["name"],
+        "rating": statistics.get("ratings_average") or "N/A",
+        "num_ratings": statistics.get("ratings_count") or "N/A",
+        "price": float(price) if price is not None else "N/A",
+        "food_pairings": [food["name"] for food in style.get("food") or []],
+    }
+
+
+class WineCatalog:
+    def __init__(self, path: str = CATALOG_PATH):
+        """
+        SQLite store of harvested Vivino wines with a full-text index
+
+        The index uses SQLite's trigram tokenizer when it is available, so partial
+        and misspelled words still find candidates, and word tokens otherwise.
+
+        Args:
+            path (str): Location of the SQLite file
+        """
+        self.path = path
+        self.lock = threading.Lock()
+
+        # Make sure the catalog folder exists
+        folder = os.path.dirname(path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+
+        # One connection shared by the lookup threads, guarded by the lock
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS wines (
+                    vintage_id INTEGER PRIMARY KEY,
+                    text TEXT NOT NULL,
+                    year TEXT NOT NULL,
+                    type_id INTEGER,
+                    country_code TEXT,
+                    num_ratings INTEGER,
+                    data TEXT NOT NULL,
+                    harvested REAL NOT NULL
+                )
+                """)
+            try:
+                self.conn.execute(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS wines_fts USING fts5("
+                    "text, content='wines', content_rowid='vintage_id', "
+                    "tokenize='trigram')"
+                )
+            except sqlite3.OperationalError:
+                # SQLite older than 3.34 has no trigram tokenizer
+                self.conn.execute(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS wines_fts USING fts5("
+                    "text, content='wines', content_rowid='vintage_id')"
+                )
+
+    def count(self):
+        """Number of wines in the catalog"""
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM wines").fetchone()[0]
+
+    def add_matches(self, matches, type_id=None, country_code=None):
+        """
+        Store explore API matches, replacing wines that were harvested before
+
+        Args:
+            matches (list): Entries of explore_vintage.matches
+            type_id (int): Wine type they were harvested under
+            country_code (str): Country they were harvested under
+
+        Returns:
+            int: Number of wines stored
+        """
+        rows = []
+        for match in matches:
+            try:
+                vintage = match["vintage"]
+                vintage_id = int(vintage["id"])
+                wine = vintage["wine"]
+                text = normalize_text(f"{wine['winery']['name']} {wine['name']}")
+                data = match_to_wine(match)
+            except (KeyError, TypeError, ValueError):
+                continue
+            rows.append(
+                (
+                    vintage_id,
+                    text,
+                    normalize_vintage(vintage.get("year")),
+                    type_id,
+                    country_code,
+                    data["num_ratings"] if data["num_ratings"] != "N/A" else 0,
+                    json.dumps(data),
+                    time.time(),
+                )
+            )
+
+        with self.lock, self.conn:
+            for row in rows:
+                # External-content FTS rows have to be removed before they change
+                old = self.conn.execute(
+                    "SELECT text FROM wines WHERE vintage_id = ?", (row[0],)
+                ).fetchone()
+                if old is not None:
+                    self.conn.execute(
+                        "INSERT INTO wines_fts (wines_fts, rowid, text) "
+                        "VALUES ('delete', ?, ?)",
+                        (row[0], old[0]),
+                    )
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO wines VALUES (?, ?, ?, ?, ?, ?, ?, ?)", row
+                )
+                self.conn.execute(
+                    "INSERT INTO wines_fts (rowid, text) VALUES (?, ?)",
+                    (row[0], row[1]),
+                )
+        return len(rows)
+
+    def candidates(self, text: str, year: str = "", limit: int = 50):
+        """
+        Wines whose names share words or trigrams with text, best first
+
+        Args:
+            text (str): Normalized producer and wine name
+            year (str): Only return this vintage (default: any vintage)
+            limit (int): Number of candidates returned
+
+        Returns:
+            list: (text, num_ratings, data) tuples
+        """
+        # Words shorter than a trigram cannot be searched for, only scored
+        terms = [f'"{word}"' for word in text.split() if len(word) >= 3]
+        if not terms:
+            return []
+        query = """
+            SELECT wines.text, wines.num_ratings, wines.data
+            FROM wines_fts JOIN wines ON wines.vintage_id = wines_fts.rowid
+            WHERE wines_fts MATCH ?
+        """
+        params = [" OR ".join(terms)]
+        if year:
+            query += " AND wines.year = ?"
+            params.append(year)
+        query += " ORDER BY bm25(wines_fts) LIMIT ?"
+        params.append(limit)
+        with self.lock:
+            return self.conn.execute(query, params).fetchall()
+
+    def match(self, producer, name, vintage, min_score: float = 0.8):
+        """
+        Find a menu wine in the catalog
+
+        When the menu gives a vintage only that vintage can match, since the
+        rating, price and link all belong to it; other vintages are left to live
+        search. Candidates are scored by the share of the menu's producer and name
+        words they contain, then by number of ratings. The bar is higher than for
+        live search, since a wine missing from the catalog should go to live
+        search rather than match a neighbour.
+
+        Args:
+            producer (str): Producer from the menu
+            name (str): Wine name from the menu
+            vintage (str): Vintage from the menu
+            min_score (float): Share of the menu's words the match must contain
+
+        Returns:
+            dict: Wine data as returned by vivino_search (without price_multiplier),
+                or None if there is no confident match
+        """
+        query = normalize_text(f"{producer} {name}")
+        query_tokens = set(query.split())
+        if not query_tokens:
+            return None
+
+        best, best_key = None, None
+        for text, num_ratings, data in self.candidates(
+            query, normalize_vintage(vintage)
+        ):
+            found = set(text.split())
+            score = len(query_tokens & found) / len(query_tokens)
+            # Prefer wines with fewer words the menu does not mention
+            precision = len(query_tokens & found) / len(found) if found else 0.0
+            key = (score, precision, num_ratings or 0)
+            if best_key is None or key > best_key:
+                best, best_key = data, key
+
+        if best_key is None or best_key[0] < min_score:
+            return None
+        return json.loads(best)
+
+    def harvest(
+        self,
+        country_codes,
+        wine_type_ids=(1, 2, 3, 4),
+        max_pages: int = 40,
+        per_page: int = 25,
+        min_ratings: int = 25,
+        currency_code=None,
+        limiter=None,
+        retries: int = 5,
+    ):
+        """
+        Download wines from the explore endpoint into the catalog
+
+        Each country and wine type is paged through in order of popularity until
+        Vivino has no more matches or max_pages is reached.
+
+        Args:
+            country_codes (list): Two-letter country codes, e.g. ["fr", "it"]
+            wine_type_ids (list): Vivino wine types (see WINE_TYPES)
+            max_pages (int): Pages fetched per country and type
+            per_page (int): Wines per page
+            min_ratings (int): Skip wines with fewer ratings than this
+            currency_code (str): Currency for prices (default: Vivino's choice)
+            limiter (AdaptiveRateLimiter): Rate limiter for the requests
+            retries (int): Times a page is retried after throttling or a failed
+                request before it is skipped
+
+        Returns:
+            int: Number of wines stored
+        """
+        if limiter is None:
+            limiter = AdaptiveRateLimiter(rate=1.0, burst=1)
+
+        stored = 0
+        for country_code in country_codes:
+            for type_id in wine_type_ids:
+                for page in range(1, max_pages + 1):
+                    params = {
+                        "country_codes[]": country_code.lower(),
+                        "wine_type_ids[]": type_id,
+                        "min_rating": 1,
+                        "min_ratings": min_ratings,
+                        "order_by": "ratings_count",
+                        "order": "desc",
+                        "page": page,
+                        "per_page": per_page,
+                    }
+                    if currency_code:
+                        params["currency_code"] = currency_code
+
+                    matches = self._fetch_page(params, limiter, retries)
+                    # A page that kept failing is skipped; an empty one is the end
+                    if matches is None:
+                        print(f"Giving up on {country_code} type {type_id} page {page}")
+                        continue
+                    if not matches:
+                        break
+                    stored += self.add_matches(matches, type_id, country_code.lower())
+
+                print(
+                    f"{country_code} {WINE_TYPES.get(type_id, type_id)}: "
+                    f"{self.count()} wines in catalog"
+                )
+        return stored
+
+    def _fetch_page(self, params, limiter, retries):
+        # Matches of one explore page, retrying throttling and failed requests;
+        # None if every attempt failed
+        for attempt in range(retries + 1):
+            limiter.acquire()
+            try:
+                with span("catalog.harvest", page=params["page"]):
+                    response = get_client().get(EXPLORE_URL, params=params)
+                check_response(response)
+                matches = response.json()["explore_vintage"]["matches"]
+            except Throttled as e:
+                limiter.record(THROTTLED, e.retry_after)
+                continue
+            except REQUEST_ERRORS + (ServerError, ValueError, KeyError, TypeError) as e:
+                print(f"Error harvesting page {params['page']}: {str(e)}")
+                limiter.record(ERROR)
+                continue
+            limiter.record(OK)
+            return matches
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument(
+        "--countries", nargs="+", required=True, help="Country codes, e.g. fr it us"
+    )
+    parser.add_argument(
+        "--types",
+        nargs="+",
+        type=int,
+        default=[1, 2, 3, 4],
+        help="Vivino wine type ids (1 red, 2 white, 3 sparkling, 4 rose, 7 dessert, 24 fortified)",
+    )
+    parser.add_argument(
+        "--pages", type=int, default=40, help="Pages per country and type"
+    )
+    parser.add_argument(
+        "--min-ratings", type=int, default=25, help="Skip wines with fewer ratings"
+    )
+    parser.add_argument("--currency", help="Currency code for prices, e.g. USD")
+    parser.add_argument(
+        "--rate", type=float, default=1.0, help="Starting requests per second"
+    )
+    parser.add_argument("--path", default=CATALOG_PATH, help="Catalog SQLite file")
+    args = parser.parse_args()
+
+    catalog = WineCatalog(args.path)
+    stored = catalog.harvest(
+        args.countries,
+        wine_type_ids=args.types,
+        max_pages=args.pages,
+        min_ratings=args.min_ratings,
+        currency_code=args.currency,
+        limiter=AdaptiveRateLimiter(rate=args.rate, burst=1),
+    )
+    print(f"Stored {stored} wines; {catalog.count()} in {args.path}")
+
+
+if __name__ == "__main__":
+    main()
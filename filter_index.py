@@ -0,0 +1,126 @@
+import numpy as np
+import pandas as pd
+
+# Columns filtered by picking values, and the filter argument for each
+FACETS = {
+    "size": "sizes",
+    "main_type": "wine_types",
+    "type": "grapes",
+    "country": "countries",
+    "region": "regions",
+}
+
+# Columns filtered by a (min, max) range, and the filter argument for each
+RANGES = {"menu_price": "price", "rating": "rating"}
+
+
+class FilterIndex:
+    def __init__(self, df: pd.DataFrame):
+        """
+        Precomputed index for filtering an enriched menu
+
+        Each facet column is stored as one array of category codes (missing values
+        get code -1) with a dict from value to code, and each range column as its
+        values in sorted order. A facet filter is then one np.isin over the codes,
+        and the number of wines per value for the remaining wines is a bincount.
+
+        Args:
+            df (pd.DataFrame): Normalized enriched menu
+        """
+        self.df = df
+        self.size = len(df)
+        self.codes = {}
+        self.categories = {}
+        self.code_of = {}
+        self.sorted_positions = {}
+        self.sorted_values = {}
+
+        for column in FACETS:
+            if column not in df.columns:
+                continue
+            values = df[column].astype("category")
+            codes = values.cat.codes.to_numpy()
+            self.codes[column] = codes
+            self.categories[column] = list(values.cat.categories)
+            self.code_of[column] = {
+                value: code for code, value in enumerate(values.cat.categories)
+            }
+
+        for column in RANGES:
+            if column not in df.columns:
+                continue
+            values = df[column].to_numpy(dtype=float)
+            order = np.argsort(values, kind="stable")
+            self.sorted_positions[column] = order
+            self.sorted_values[column] = values[order]
+
+    def _code(self, column, value):
+        # Code of a value in a facet column, or None if it is not in the menu
+        if pd.isna(value):
+            return -1
+        return self.code_of[column].get(value)
+
+    def range_mask(self, column, low, high):
+        """Rows with low <= column <= high, found by binary search on the sorted values"""
+        mask = np.zeros(self.size, dtype=bool)
+        values = self.sorted_values[column]
+        start = np.searchsorted(values, low, side="left")
+        stop = np.searchsorted(values, high, side="right")
+        mask[self.sorted_positions[column][start:stop]] = True
+        return mask
+
+    def facet_mask(self, column, values):
+        """Rows whose column holds one of values"""
+        codes = [self._code(column, value) for value in values]
+        selected = np.array([code for code in codes if code is not None], dtype=int)
+        return np.isin(self.codes[column], selected)
+
+    def mask(self, **filters):
+        """
+        Boolean mask of the rows matching every filter
+
+        Args:
+            filters: price and rating as (min, max), and sizes, wine_types, grapes,
+                countries and regions as the values to keep. Filters that are None,
+                or whose column is not in the menu, are not applied.
+
+        Returns:
+            np.ndarray: Boolean mask over the rows of the menu
+        """
+        mask = np.ones(self.size, dtype=bool)
+        for column, name in RANGES.items():
+            bounds = filters.get(name)
+            if bounds is not None and column in self.sorted_values:
+                mask &= self.range_mask(column, *bounds)
+        for column, name in FACETS.items():
+            values = filters.get(name)
+            if values is not None and column in self.codes:
+                mask &= self.facet_mask(column, values)
+        return mask
+
+    def counts(self, column, mask=None):
+        """
+        Number of wines with each value of a facet column
+
+        Args:
+            column (str): Facet column
+            mask (np.ndarray): Only count these rows (default: all)
+
+        Returns:
+            dict: Value to count, for values with at least one wine; missing
+                values are counted under NaN
+        """
+        codes = self.codes[column] if mask is None else self.codes[column][mask]
+        # Shift by one so missing values (-1) land in bin 0
+        bins = np.bincount(codes + 1, minlength=len(self.categories[column]) + 1)
+        counts = {}
+        if bins[0]:
+            counts[np.nan] = int(bins[0])
+        for code, count in enumerate(bins[1:]):
+            if count:
+                counts[self.categories[column][code]] = int(count)
+        return counts
+
+    def select(self, mask):
+        """Rows of the menu selected by a mask"""
+        return self.df[mask]
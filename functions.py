@@ -8,51 +8,116 @@ from dotenv import load_dotenv
 import os
 import streamlit as st
 import google.generativeai as genai
+from google.api_core.exceptions import ResourceExhausted
+from cache import ParseCache, PdfTextCache, file_hash
+from pdf_extract import (
+    PARALLEL_MIN_PAGES,
+    count_pages,
+    extract_folder,
+    extract_pages_parallel,
+)
+from packing import PagePacker, assign_pages
+from stream_json import WineStreamParser, salvage_wines
+from tracing import count, get_tracer, span, traced
 from typing import List, Dict
 import json
 import PyPDF2
 
 
-def extract_text_from_pdf(pdf_path):
+def iter_pdf_pages(pdf_path, cache=None):
     """
-    Extract text from a PDF file.
+    Yield the text of each page of a PDF, one page at a time
+
+    The PDF is opened once and pages are extracted lazily, so callers can start
+    on page 1 before the rest is read. Text is cached by file hash, so a PDF that
+    was extracted before is served without PyPDF2.
 
     Args:
         pdf_path (str): Path to the PDF file
+        cache (PdfTextCache): Cache of extracted text (default: the shared on-disk
+            cache), or False to always extract
 
-    Returns:
-        dict: Dictionary containing page numbers and their corresponding text
+    Yields:
+        tuple: (page_number, text) with page numbers starting at 1
     """
-    # Dictionary to store text from each page
-    text_by_page = {}
-
-    try:
-        # Open the PDF file in binary read mode
-        with open(pdf_path, "rb") as file:
+    if cache is None:
+        cache = PdfTextCache()
+
+    digest = file_hash(pdf_path) if cache else None
+
+    # Serve a fully cached PDF without opening it
+    if cache:
+        num_pages = cache.num_pages(digest)
+        if num_pages is not None:
+            for page_num in range(1, num_pages + 1):
+                with span("pdf.page", page=page_num) as current:
+                    text = cache.get_page(digest, page_num)
+                    current.count("cache_hits")
+                yield page_num, text
+            return
+
+    # Open the PDF file in binary read mode
+    with open(pdf_path, "rb") as file:
+        with span("pdf.open", file=os.path.basename(pdf_path)) as current:
             # Create a PDF reader object
             pdf_reader = PyPDF2.PdfReader(file)
 
             # Get the number of pages
             num_pages = len(pdf_reader.pages)
+            current.set(pages=num_pages)
+
+        # Extract text from each page
+        for page_num in range(1, num_pages + 1):
+            # A corrupt page only loses its own text
+            with span("pdf.page", page=page_num) as current:
+                try:
+                    text = pdf_reader.pages[page_num - 1].extract_text()
+                except Exception as e:
+                    print(f"Error extracting page {page_num}: {str(e)}")
+                    current.count("failures")
+                    text = ""
+                current.count("chars", len(text))
+            if cache:
+                cache.set_page(digest, page_num, text)
+            yield page_num, text
+
+    if cache:
+        cache.mark_complete(digest, num_pages)
+
+
+def extract_text_from_pdf(pdf_path, processes=0):
+    """
+    Extract text from a PDF file.
 
-            # Extract text from each page
-            for page_num in range(num_pages):
-                # Get the page object
-                page = pdf_reader.pages[page_num]
+    Args:
+        pdf_path (str): Path to the PDF file
+        processes (int): Extract pages in this many processes (default: 0 to
+            extract in this process, page by page)
 
-                # Extract text from the page
-                text = page.extract_text()
+    Returns:
+        dict: Dictionary containing page numbers and their corresponding text
+    """
+    try:
+        if processes:
+            cache = PdfTextCache()
+            digest = file_hash(pdf_path)
+            num_pages = cache.num_pages(digest)
+            if num_pages is not None:
+                return dict(iter_pdf_pages(pdf_path, cache=cache))
 
-                # Store the text in our dictionary
-                text_by_page[page_num + 1] = text
+            text_by_page = extract_pages_parallel(pdf_path, max_workers=processes)
+            for page_num, text in text_by_page.items():
+                cache.set_page(digest, page_num, text)
+            cache.mark_complete(digest, len(text_by_page))
+            return text_by_page
 
-        return text_by_page
+        return dict(iter_pdf_pages(pdf_path))
 
     # Error Messaging
     except FileNotFoundError:
         print(f"Error: The file {pdf_path} was not found.")
         return None
-    except PyPDF2.PdfReadError:
+    except PyPDF2.errors.PdfReadError:
         print("Error: Invalid or corrupted PDF file.")
         return None
     except Exception as e:
@@ -60,26 +125,69 @@ def extract_text_from_pdf(pdf_path):
         return None
 
 
+def extract_folder_text(folder, processes=None):
+    """
+    Extract every PDF in a folder into the PDF text cache, one PDF per process
+
+    Run this before scanning a folder so scans read the text from the cache. PDFs
+    already in the cache are skipped.
+
+    Args:
+        folder (str): Folder of PDFs, e.g. menus/
+        processes (int): Number of processes (default: one per core)
+
+    Returns:
+        int: Number of PDFs extracted
+    """
+    cache = PdfTextCache()
+    digests = {
+        os.path.join(folder, name): file_hash(os.path.join(folder, name))
+        for name in os.listdir(folder)
+        if name.lower().endswith(".pdf")
+    }
+    cached = {
+        pdf_path
+        for pdf_path, digest in digests.items()
+        if cache.num_pages(digest) is not None
+    }
+
+    with span("pdf.extract_folder", pdfs=len(digests) - len(cached)):
+        extracted = extract_folder(folder, max_workers=processes, skip=cached)
+    for pdf_path, text_by_page in extracted.items():
+        if text_by_page is None:
+            continue
+        for page_num, text in text_by_page.items():
+            cache.set_page(digests[pdf_path], page_num, text)
+        cache.mark_complete(digests[pdf_path], len(text_by_page))
+    return len(extracted)
+
+
 # Made with Claude 3.5
 
 
 class GeminiWineParser:
-    def __init__(self, api_key: str):
-        """Initialize the Gemini parser with API key"""
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel("gemini-2.0-flash")
+    # Bump whenever the prompt below changes so cached parses are not reused
+    PROMPT_VERSION = 2
 
-    def parse_wine_list(self, text: str) -> List[Dict]:
+    def __init__(self, api_key: str, cache=None, stream: bool = False):
         """
-        Parse wine list text using Gemini 1.5
+        Initialize the Gemini parser with API key
 
         Args:
-            text (str): The wine list text to parse
-
-        Returns:
-            List[Dict]: List of parsed wine entries
+            api_key (str): Google API key
+            cache (ParseCache): Cache of earlier page parses (default: the shared
+                on-disk cache), or False to always call Gemini
+            stream (bool): Read responses as they stream in (see parse_wine_list_stream)
         """
-        prompt = f"""Extract wine information from the text below into a structured format.
+        genai.configure(api_key=api_key)
+        self.model_name = "gemini-2.0-flash"
+        self.model = genai.GenerativeModel(self.model_name)
+        self.cache = ParseCache() if cache is None else cache
+        self.stream = stream
+
+    def _build_prompt(self, text: str) -> str:
+        """Prompt asking Gemini for the wines in text as JSON"""
+        return f"""Extract wine information from the text below into a structured format.
         For each wine entry, extract:
         - ID number
         - Producer
@@ -90,6 +198,7 @@ class GeminiWineParser:
         - Vintage (if available)
         - Price
         - Size (glass, bottle, half bottle, magnum)
+        - Page (the number from the nearest "--- PAGE n ---" line above the wine, if any)
         
         Format as JSON with missing fields as null but get as many wines as possible even if some fields are missing.
         
@@ -108,36 +217,138 @@ class GeminiWineParser:
                     "country": "Country",
                     "vintage": "2020",
                     "price": "123",
-                    "size": "bottle"
+                    "size": "bottle",
+                    "page": 1
                 }}
             ]
         }}"""
 
+    def _generate(self, prompt: str, stream: bool = False):
+        return self.model.generate_content(
+            prompt,
+            generation_config={
+                "temperature": 0.0,  # Use deterministic output
+                "top_p": 1.0,
+                "top_k": 1,
+            },
+            stream=stream,
+        )
+
+    def parse_wine_list(self, text: str) -> List[Dict]:
+        """
+        Parse wine list text using Gemini 1.5
+
+        Args:
+            text (str): The wine list text to parse
+
+        Returns:
+            List[Dict]: List of parsed wine entries
+        """
+        if self.stream:
+            return list(self.parse_wine_list_stream(text))
+
+        # Output is deterministic, so a page parsed before can be served from the cache
+        if self.cache:
+            key = ParseCache.make_key(text, self.PROMPT_VERSION, self.model_name)
+            wines = self.cache.get(key)
+            if wines is not None:
+                count("cache_hits")
+                return wines
+
+        response_text = ""
         try:
-            response = self.model.generate_content(
-                prompt,
-                generation_config={
-                    "temperature": 0.0,  # Use deterministic output
-                    "top_p": 1.0,
-                    "top_k": 1,
-                },
-            )
+            prompt = self._build_prompt(text)
+            with span("gemini.request", model=self.model_name) as current:
+                response = self._generate(prompt)
+
+                # Find the JSON in the response
+                response_text = response.text
+                current.count("bytes_sent", len(prompt.encode("utf-8")))
+                current.count("bytes_received", len(response_text.encode("utf-8")))
+
+            with span("gemini.decode"):
+                # Look for JSON between ```json and ``` if present
+                if "```json" in response_text:
+                    json_str = response_text.split("```json")[1].split("```")[0].strip()
+                else:
+                    json_str = response_text.strip()
 
-            # Find the JSON in the response
-            response_text = response.text
-            # Look for JSON between ```json and ``` if present
-            if "```json" in response_text:
-                json_str = response_text.split("```json")[1].split("```")[0].strip()
-            else:
-                json_str = response_text.strip()
+                # Parse the JSON response
+                json_response = json.loads(json_str)
+                wines = json_response["wines"]
 
-            # Parse the JSON response
-            json_response = json.loads(json_str)
-            return json_response["wines"]
+            # Only successful parses are cached so failures get retried
+            if self.cache:
+                self.cache.set(key, wines)
+            return wines
 
+        except ResourceExhausted:
+            # Let quota errors through so the caller can back off and retry
+            raise
         except Exception as e:
-            print(f"Error parsing wine list: {str(e)}")
-            return []
+            # Keep the wines that were complete in a truncated or malformed response
+            wines = salvage_wines(response_text)
+            print(f"Error parsing wine list: {str(e)} (salvaged {len(wines)} wines)")
+            count("failures")
+            return wines
+
+    def parse_wine_list_stream(self, text: str):
+        """
+        Parse wine list text, yielding each wine as soon as it has streamed in
+
+        If the response is cut off, the wines completed before the cut are still
+        yielded.
+
+        Args:
+            text (str): The wine list text to parse
+
+        Yields:
+            Dict: Parsed wine entries
+        """
+        if self.cache:
+            key = ParseCache.make_key(text, self.PROMPT_VERSION, self.model_name)
+            wines = self.cache.get(key)
+            if wines is not None:
+                count("cache_hits")
+                yield from wines
+                return
+
+        parser = WineStreamParser()
+        wines = []
+        prompt = self._build_prompt(text)
+
+        # The request stays open across yields, so it is timed by hand
+        started = time.perf_counter()
+        counters = {"bytes_sent": len(prompt.encode("utf-8")), "bytes_received": 0}
+        error = None
+        try:
+            for chunk in self._generate(prompt, stream=True):
+                counters["bytes_received"] += len(chunk.text.encode("utf-8"))
+                for wine in parser.feed(chunk.text):
+                    wines.append(wine)
+                    yield wine
+        except ResourceExhausted as e:
+            error = f"ResourceExhausted: {str(e)}"
+            raise
+        except Exception as e:
+            print(f"Error streaming wine list: {str(e)} (kept {len(wines)} wines)")
+            error = f"{type(e).__name__}: {str(e)}"
+            return
+        finally:
+            get_tracer().record(
+                "gemini.request",
+                started,
+                counters=counters,
+                error=error,
+                model=self.model_name,
+                stream=True,
+            )
+
+        # Only complete responses are cached
+        if parser.done and self.cache:
+            self.cache.set(key, wines)
+        elif not parser.done:
+            print(f"Wine list response was cut off (kept {len(wines)} wines)")
 
     def parse_pdf_and_wine_list(
         self, pdf_path: str, page_number: int = 1
@@ -153,13 +364,10 @@ class GeminiWineParser:
             List[Dict]: List of parsed wine entries
         """
         try:
-            with open(pdf_path, "rb") as file:
-                reader = PyPDF2.PdfReader(file)
-                if page_number <= len(reader.pages):
-                    text = reader.pages[page_number - 1].extract_text()
+            for page_num, text in iter_pdf_pages(pdf_path):
+                if page_num == page_number:
                     return self.parse_wine_list(text)
-                else:
-                    raise ValueError(f"PDF has only {len(reader.pages)} pages")
+            raise ValueError(f"PDF has only {page_num} pages")
         except Exception as e:
             print(f"Error processing PDF: {str(e)}")
             return []
@@ -174,64 +382,237 @@ class GeminiWineParser:
             print(f"Error saving to file: {str(e)}")
 
 
-import requests
-from bs4 import BeautifulSoup
-import re
+import queue
+import threading
+import random
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
+from throttle import (
+    ERROR,
+    OK,
+    THROTTLED,
+    AdaptiveRateLimiter,
+    ServerError,
+    Throttled,
+    check_response,
+)
+from http_client import REQUEST_ERRORS, get_client
+from cache import (
+    LookupCache,
+    identity_key,
+    normalize_text,
+    normalize_vintage,
+    wine_key,
+)
+from jobs import EnrichmentJob, row_fingerprint
+from schema import clean_price, normalize_enriched
+from storage import save_table
+from html_extract import parse_search_card, parse_wine_page
+from rule_parser import RuleWineParser
+from catalog import CATALOG_PATH, WineCatalog, match_to_wine
+
+
+def parse_chunk_with_retry(parser, chunk, retries=4, backoff=2.0, on_wine=None):
+    """
+    Parse one chunk of pages, backing off and retrying when the Gemini quota is exhausted
 
+    Args:
+        parser (GeminiWineParser): Parser to use
+        chunk (dict): Chunk from PagePacker with "pages", "text" and "page_texts"
+        retries (int): Number of retries after a quota error
+        backoff (float): Initial wait in seconds, doubled after every retry
+        on_wine (callable): Optional on_wine(wine) callback, called with each wine
+            (page set) as soon as it arrives when the parser streams, and once the
+            chunk is parsed otherwise
 
-def create_csv_menu(pdf_path, csv_path, page_nums=0, editor=False):
+    Returns:
+        List[Dict]: Parsed wine entries with a "page" field
+    """
+    streaming = on_wine is not None and getattr(parser, "stream", False)
+    sent = 0
+    label = "-".join(str(page_num) for page_num in chunk["pages"])
+    with span("gemini.chunk", pages=label) as current:
+        for attempt in range(retries + 1):
+            try:
+                if streaming:
+                    chunk_results = []
+                    for wine in parser.parse_wine_list_stream(chunk["text"]):
+                        chunk_results.append(wine)
+                        # Output is deterministic, so wines sent before a quota
+                        # error come back first on the retry and are not sent again
+                        if len(chunk_results) > sent:
+                            on_wine(dict(assign_pages([wine], chunk)[0]))
+                            sent += 1
+                else:
+                    chunk_results = parser.parse_wine_list(chunk["text"])
+                break
+            except ResourceExhausted:
+                if attempt == retries:
+                    print(f"Quota exhausted on page {label}, giving up")
+                    current.count("failures")
+                    return chunk_results if streaming else []
+                delay = backoff * (2**attempt) + random.uniform(0, 1)
+                print(f"Quota exhausted on page {label}, retrying in {delay:.1f}s")
+                current.count("retries")
+                time.sleep(delay)
+
+    # Add page number to every wine
+    wines = assign_pages(chunk_results, chunk)
+    if on_wine is not None and not streaming:
+        for wine in wines:
+            on_wine(dict(wine))
+    return wines
+
+
+@traced("scan")
+def create_csv_menu(
+    pdf_path,
+    csv_path,
+    page_nums=0,
+    editor=False,
+    max_workers=4,
+    parser=None,
+    max_tokens=2500,
+    rules=None,
+    on_wine=None,
+    extract_processes=None,
+):
     """
     Parse PDF menu to CSV with manual correction capability
 
     Args:
         pdf_path (str): Path to PDF file
+        csv_path (str): Where to save the scanned menu; .parquet keeps the column
+            types, .csv writes plain CSV
         page_nums (int): Page number to parse (default: 0 for all pages)
+        max_workers (int): Number of pages sent to Gemini at once
+        parser (GeminiWineParser): Parser to use (default: one built with the key
+            in st.secrets)
+        max_tokens (int): Token budget per Gemini request; short pages are packed
+            together and long pages split to fit it
+        rules (RuleWineParser): Local parser tried on each page first; only pages
+            it cannot parse confidently go to Gemini (default: a RuleWineParser
+            with its default threshold), or False to send every page to Gemini
+        on_wine (callable): Optional on_wine(wine) callback, called from the calling
+            thread with each wine as soon as it is parsed; Gemini responses are
+            streamed so wines arrive before their page is finished (the default
+            parser streams when on_wine is given)
+        extract_processes (int): Processes that extract a PDF of
+            PARALLEL_MIN_PAGES pages or more up front (default: one per core), or
+            0 to always extract page by page as the pages are parsed
 
     Returns:
         str: Path to saved CSV file
     """
     print("INITIALIZING")
-    # Initialize parser
-    load_dotenv(dotenv_path="config.env")
-    google_key = st.secrets["GOOGLE_API_KEY"]
-    parser = GeminiWineParser(google_key)
+    # Long PDFs that are not cached yet are extracted into the text cache by a
+    # process pool before the Gemini workers start; the pages are then read back
+    # from the cache below
+    if extract_processes != 0 and page_nums == 0:
+        processes = extract_processes or os.cpu_count() or 1
+        try:
+            if (
+                processes > 1
+                and PdfTextCache().num_pages(file_hash(pdf_path)) is None
+                and count_pages(pdf_path) >= PARALLEL_MIN_PAGES
+            ):
+                with span("pdf.extract_parallel", processes=processes):
+                    extract_text_from_pdf(pdf_path, processes=processes)
+        except Exception as e:
+            print(f"Error extracting {pdf_path} in parallel: {str(e)}")
 
-    # Parse PDF
+    # Initialize parser
+    if parser is None:
+        load_dotenv(dotenv_path="config.env")
+        google_key = st.secrets["GOOGLE_API_KEY"]
+        parser = GeminiWineParser(google_key, stream=on_wine is not None)
+    if rules is None:
+        rules = RuleWineParser()
+
+    # Extract pages one at a time and hand each chunk to a worker as soon as it is full
     print("EXTRACTING TEXT")
-    pages = extract_text_from_pdf(pdf_path)
-    print(pages[1])
-    print("DONE EXTRACTING TEXT")
-
-    max_pages = max(pages.keys())
-    pages_to_process = page_nums if page_nums > 0 else max_pages
-
-    # Process each page individually
-    all_results = []
-    for page_num in range(1, pages_to_process + 1):
-        print(f"\nProcessing page {page_num}/{pages_to_process}")
-        page_text = pages[page_num]
-        print(f"Page {page_num} text length: {len(page_text)} characters")
-
-        # Skip empty pages
-        if not page_text.strip():
-            print(f"Skipping page {page_num} - empty text")
-            continue
+    packer = PagePacker(max_tokens=max_tokens)
+    results_by_chunk = {}
+    # Type and country headings carried from one page to the next
+    headings = {}
+    # Wines streamed by the workers, handed to on_wine from this thread
+    streamed = queue.Queue()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+
+        def submit(chunks):
+            for chunk in chunks:
+                future = executor.submit(
+                    parse_chunk_with_retry,
+                    parser,
+                    chunk,
+                    on_wine=streamed.put if on_wine is not None else None,
+                )
+                futures[future] = ((chunk["pages"][0], len(futures)), chunk["pages"])
 
-        # Parse the page
         try:
-            page_results = parser.parse_wine_list(page_text)
-            print(f"Found {len(page_results)} wines on page {page_num}")
-            all_results.extend(page_results)
+            for page_num, page_text in iter_pdf_pages(pdf_path):
+                if page_nums > 0 and page_num > page_nums:
+                    break
+                print(f"Page {page_num} text length: {len(page_text)} characters")
+
+                # Skip empty pages
+                if not page_text.strip():
+                    print(f"Skipping page {page_num} - empty text")
+                    continue
+
+                # Well-structured pages are parsed locally without a Gemini request
+                if rules:
+                    with span("rules.page", page=page_num) as current:
+                        wines = rules.parse(page_text, page_num, headings)
+                        if wines is not None:
+                            current.count("wines", len(wines))
+                    if wines is not None:
+                        results_by_chunk[(page_num, -1)] = wines
+                        print(f"Found {len(wines)} wines on page {page_num} locally")
+                        for wine in wines if on_wine is not None else []:
+                            streamed.put(dict(wine))
+                        continue
+
+                submit(packer.add(page_num, page_text))
         except Exception as e:
-            print(f"Error parsing page {page_num}: {str(e)}")
-            continue
-
-        # Add page number to all_results
+            print(f"Error extracting text from {pdf_path}: {str(e)}")
+        submit(packer.flush())
+        print("DONE EXTRACTING TEXT")
+
+        # Hand wines to the caller as they stream in, until every chunk is parsed
+        if on_wine is not None:
+            pending = set(futures)
+            while pending or not streamed.empty():
+                if pending:
+                    _, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+                while not streamed.empty():
+                    on_wine(streamed.get())
+
+        # Parse the chunks concurrently
+        for future in as_completed(futures):
+            index, pages = futures[future]
+            try:
+                results_by_chunk[index] = future.result()
+                print(f"Found {len(results_by_chunk[index])} wines on pages {pages}")
+            except Exception as e:
+                print(f"Error parsing pages {pages}: {str(e)}")
+
+    # Merge the results back in page order, keyed by (first page, submit order)
+    all_results = []
+    for index in sorted(results_by_chunk):
+        all_results.extend(results_by_chunk[index])
 
     print("PARSING WINE LIST")
     print("DONE PARSING WINE LIST")
     # Convert to DataFrame
-    df = pd.DataFrame(all_results)
+    with span("frame.assemble", rows=len(all_results)):
+        df = pd.DataFrame(all_results)
     print("TOTAL WINES: ", len(df))
     if editor:
         # Display DataFrame for review
@@ -256,142 +637,297 @@ def create_csv_menu(pdf_path, csv_path, page_nums=0, editor=False):
             else:
                 print("Please enter 'yes' or 'no'")
 
-    # Save to CSV
-    df.to_csv(csv_path, index=False)
+    # Save the scanned menu
+    with span("frame.save", rows=len(df)):
+        save_table(df, csv_path)
     print(f"\nSaved corrected data to: {csv_path}")
     return df
 
 
-def vivino_search(name, producer, type, region, country, vintage, menu_price):
+def compute_price_multiplier(menu_price, price):
+    """Menu price divided by Vivino price, or "N/A" if either is not a number"""
+    try:
+        return float(menu_price) / float(price)
+    except (TypeError, ValueError, ZeroDivisionError):
+        return "N/A"
 
-    # Define the base URL
-    base_url = "https://www.vivino.com/search/wines"
 
-    # Create the search query
-    query = f"{name} {producer} {type} {vintage} {region} {country}"
+def _vivino_get(stage, url, limiter=None, params=None, headers=None):
+    """
+    Send one request to Vivino, taking a rate limiter token for it first
 
-    # Send request to Vivino search page
-    params = {"q": query}
+    Every request takes its own token and reports its own outcome, so the limiter's
+    rate is the request rate Vivino sees, whichever searches make up a lookup.
+
+    Args:
+        stage (str): Span name for the request, e.g. "vivino.search_api"
+        url (str): Full URL
+        limiter (AdaptiveRateLimiter): Rate limiter to take the token from, if any
+        params (dict): Query parameters
+        headers (dict): Request headers
+
+    Returns:
+        Response from the shared client
+
+    Raises:
+        Throttled: Vivino asked us to slow down
+        ServerError: Vivino answered with a server error
+    """
+    if limiter is not None:
+        with span("vivino.wait"):
+            limiter.acquire()
+    try:
+        with span(stage):
+            response = get_client().get(url, params=params, headers=headers)
+        check_response(response)
+    except Throttled as e:
+        if limiter is not None:
+            limiter.record(THROTTLED, e.retry_after)
+        raise
+    except REQUEST_ERRORS + (ServerError,):
+        if limiter is not None:
+            limiter.record(ERROR)
+        raise
+    if limiter is not None:
+        limiter.record(OK)
+    return response
+
+
+def _match_score(query_tokens, match):
+    # Share of the menu's name and producer words found in the Vivino wine and winery
+    wine = match["vintage"]["wine"]
+    found = set(normalize_text(f"{wine['winery']['name']} {wine['name']}").split())
+    if not query_tokens:
+        return 0.0
+    return len(query_tokens & found) / len(query_tokens)
+
+
+def vivino_api_search(
+    name,
+    producer,
+    type,
+    region,
+    country,
+    vintage,
+    menu_price,
+    min_score=0.6,
+    limiter=None,
+):
+    """
+    Look up a wine through Vivino's explore JSON endpoint
+
+    Args:
+        name, producer, type, region, country, vintage, menu_price: Same as vivino_search
+        min_score (float): Share of the menu's name and producer words that the best
+            match must contain to be accepted
+        limiter (AdaptiveRateLimiter): Rate limiter for the request, if any
+
+    Returns:
+        dict: Same wine data as vivino_search, or None if there is no confident match
+    """
+    query = " ".join(str(x) for x in [producer, name] if str(x).strip())
+    params = {
+        "search_query": query,
+        "min_rating": 1,
+        "order_by": "ratings_count",
+        "order": "desc",
+        "page": 1,
+        "per_page": 25,
+    }
     headers = {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:66.0) Gecko/20100101 Firefox/66.0"
     }
 
-    # Send GET request
-    response = requests.get(base_url, params=params, headers=headers)
-
-    # Check if request was successful
+    response = _vivino_get(
+        "vivino.search_api",
+        "https://www.vivino.com/api/explore/explore",
+        limiter=limiter,
+        params=params,
+        headers=headers,
+    )
     if response.status_code != 200:
-        print("Failed to fetch data")
+        print("Failed to fetch data from explore API")
         return None
 
-    # Parse the HTML response
-    soup = BeautifulSoup(response.text, "html.parser")
+    try:
+        matches = response.json()["explore_vintage"]["matches"]
+    except (ValueError, KeyError, TypeError):
+        return None
+    if not matches:
+        return None
 
-    # Find first wine result
-    first_result = soup.select_one(".card.card-lg")
-    if not first_result:
-        print("No results found.")
+    # Pick the closest match, preferring the menu's vintage when there is one;
+    # malformed matches are skipped so they cannot stop the HTML fallback
+    query_tokens = set(normalize_text(query).split())
+    year = normalize_vintage(vintage)
+    best, best_key = None, None
+    for match in matches:
+        try:
+            key = (
+                _match_score(query_tokens, match),
+                str(match["vintage"].get("year")) == year,
+            )
+        except (KeyError, TypeError, AttributeError):
+            continue
+        if best_key is None or key > best_key:
+            best, best_key = match, key
+    if best_key is None or best_key[0] < min_score:
         return None
 
     # Extract wine details
     try:
-        wine_name = first_result.select_one(".wine-card__name").text.strip()
-        link = "https://www.vivino.com" + first_result.select_one("a")["href"]
-        country = first_result.select_one(
-            ".wine-card__region [data-item-type='country']"
-        ).text.strip()
-        region = first_result.select_one(
-            ".wine-card__region .link-color-alt-grey"
-        ).text.strip()
-        rating = (
-            first_result.select_one(".average__number").text.strip()
-            if first_result.select_one(".average__number")
-            else "N/A"
-        )
-        num_ratings = (
-            first_result.select_one(".text-micro").text.split(" ratings")[0].strip()
-            if first_result.select_one(".text-micro")
-            else "N/A"
-        )
-        price = (
-            first_result.select_one(".wine-price-value").text.strip()
-            if first_result.select_one(".wine-price-value")
-            else "N/A"
+        data = match_to_wine(best)
+    except (KeyError, TypeError):
+        print("Error extracting data from explore API")
+        return None
+    data["price_multiplier"] = compute_price_multiplier(menu_price, data["price"])
+
+    return data
+
+
+def vivino_search(
+    name,
+    producer,
+    type,
+    region,
+    country,
+    vintage,
+    menu_price,
+    fetch_pairings=False,
+    limiter=None,
+):
+    """
+    Look up a wine on Vivino, trying the JSON explore API before scraping the site
+
+    Args:
+        fetch_pairings (bool): Also fetch the wine page for food pairings when the
+            HTML fallback is used (default: pairings are left as "N/A" and can be
+            filled later with fetch_food_pairings)
+        limiter (AdaptiveRateLimiter): Rate limiter that every request of the lookup
+            (explore API, search page and wine page) takes a token from, if any
+
+    Returns:
+        dict: Wine data, or None if the wine was not found
+
+    Raises:
+        Throttled: Vivino asked us to slow down
+        ServerError: The HTML search failed with a server error
+    """
+    kwargs = dict(
+        name=name,
+        producer=producer,
+        type=type,
+        region=region,
+        country=country,
+        vintage=vintage,
+        menu_price=menu_price,
+    )
+    try:
+        data = vivino_api_search(**kwargs, limiter=limiter)
+    except REQUEST_ERRORS + (ServerError,) as e:
+        print(f"Explore API request failed: {str(e)}")
+        data = None
+
+    # Fall back to the HTML search when the API has no confident match
+    if data is None:
+        data = vivino_html_search(
+            **kwargs, fetch_pairings=fetch_pairings, limiter=limiter
         )
+    return data
 
-    except AttributeError:
-        print("Error extracting data")
-        return None
 
-    # print("Result found:", wine_name)
+def fetch_wine_details(link, headers=None, limiter=None):
+    """
+    Fetch a Vivino wine page for its food pairings and listed price
+
+    Args:
+        link (str): Link to the wine page
+        headers (dict): Request headers
+        limiter (AdaptiveRateLimiter): Rate limiter for the request, if any
 
-    # print("Checking link:", link)
+    Returns:
+        dict: "food_pairings" list and "price" string ("N/A" if not listed), or
+            None if the page could not be fetched
+    """
+    if headers is None:
+        headers = {
+            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:66.0) Gecko/20100101 Firefox/66.0"
+        }
 
-    link_response = requests.get(link, headers=headers)
+    link_response = _vivino_get("vivino.detail", link, limiter=limiter, headers=headers)
     if link_response.status_code != 200:
         print("Failed to fetch data")
         return None
-    link_soup = BeautifulSoup(link_response.text, "html.parser")
 
-    # Save the data as link.txt
-    with open("link.txt", "w") as f:
-        f.write(str(link_soup))
+    # Read the pairings and price straight from the page source
+    with span("html.parse_wine_page"):
+        return parse_wine_page(link_response.text)
 
-    try:
-        food_container = link_soup.select_one(".foodPairing__foodContainer--1bvxM")
 
-        # Extract food pairing names
-        food_pairings = [
-            str(a).split('aria-label="')[1].split('"')[0]
-            for a in food_container.find_all("a")
-        ]
+def vivino_html_search(
+    name,
+    producer,
+    type,
+    region,
+    country,
+    vintage,
+    menu_price,
+    fetch_pairings=False,
+    limiter=None,
+):
 
-    except AttributeError:
-        # print("Error extracting food pairings")
-        food_pairings = []
+    # Define the base URL
+    base_url = "https://www.vivino.com/search/wines"
 
-    # Extract price if not available
-    if len(price) <= 1:
-        # print("Price not available. Extracting from page")
-        try:
-            script_tag = link_soup.find("script", {"type": "application/ld+json"})
+    # Create the search query
+    query = f"{name} {producer} {type} {vintage} {region} {country}"
+
+    # Send request to Vivino search page
+    params = {"q": query}
+    headers = {
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:66.0) Gecko/20100101 Firefox/66.0"
+    }
 
-            # Load the JSON data
-            json_data = json.loads(script_tag.string)
+    # Send GET request; throttling and server errors are raised
+    response = _vivino_get(
+        "vivino.search_html", base_url, limiter=limiter, params=params, headers=headers
+    )
+    if response.status_code != 200:
+        print("Failed to fetch data")
+        return None
 
-            # Extract the price
-            price = json_data.get("offers", {}).get("price")
+    # Read the first wine card without parsing the rest of the page
+    with span("html.parse_card"):
+        card = parse_search_card(response.text)
+    if card is None:
+        print("No results found.")
+        return None
 
-            if price is None:
-                # Find the price element
-                price_element = link_soup.find(
-                    "span", class_="purchaseAvailabilityPPC__amount--2_4GT"
-                )
+    wine_name = card["name"]
+    link = card["link"]
+    country = card["country"]
+    region = card["region"]
+    rating = card["rating"]
+    num_ratings = card["num_ratings"]
+    price = card["price"]
 
-                # Extract the text and clean it
-                price = price_element.text.strip() if price_element else "N/A"
+    # print("Result found:", wine_name)
 
-        except AttributeError:
-            print("Error extracting price")
+    # Only fetch the wine page when pairings were asked for or the card has no price
+    food_pairings = "N/A"
+    if fetch_pairings or len(price) <= 1 or price == "N/A":
+        details = fetch_wine_details(link, headers=headers, limiter=limiter)
+        if details is None:
+            return None
 
-    # Check if price is a number
-    if price != "N/A" and price != "-":
-        price = price.replace("$", "")
-        price = price.replace(" ", "")
-        price = price.replace("€", "")
-        price = price.replace("£", "")
-        price = price.replace("¥", "")
-        price = price.replace("₩", "")
-        price = price.replace("₹", "")
+        if fetch_pairings:
+            food_pairings = details["food_pairings"]
+        if len(price) <= 1 or price == "N/A":
+            price = details["price"]
 
-        try:
-            price = float(price)
-            price_multiplier = menu_price / price
-        except ValueError:
-            print("Error converting price to float")
-            price_multiplier = "N/A"
-    else:
-        price_multiplier = "N/A"
+    # Strip currency symbols and check the price is a number
+    price = clean_price(price)
+    price_multiplier = compute_price_multiplier(menu_price, price)
 
     # Create output
     # Return wine data
@@ -410,83 +946,379 @@ def vivino_search(name, producer, type, region, country, vintage, menu_price):
     return data
 
 
+def _row_search_kwargs(row):
+    """Build the vivino_search keyword arguments for one menu row"""
+    fields = {
+        "name": "name",
+        "producer": "producer",
+        "type": "type",
+        "region": "region",
+        "country": "country",
+        "vintage": "vintage",
+        "menu_price": "price",
+    }
+    return {
+        arg: row[column] if column in row and pd.notna(row[column]) else " "
+        for arg, column in fields.items()
+    }
+
+
+# Lookups in flight across every running search, keyed by wine identity
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+# Vivino columns added to each row, mapped to their vivino_search keys
+VIVINO_COLUMNS = {
+    "food_pairings": "food_pairings",
+    "vivino_price": "price",
+    "price_multiplier": "price_multiplier",
+    "rating": "rating",
+    "link": "link",
+    "num_ratings": "num_ratings",
+}
+
+
+def enrich_row(row, wine_data):
+    """
+    Combine a scanned menu row with its Vivino result
+
+    Args:
+        row (dict): Scanned menu row
+        wine_data (dict): Result of vivino_search, or None if not found
+
+    Returns:
+        dict: Row with price renamed to menu_price and the Vivino columns added
+    """
+    # Rename the price column to menu_price
+    enriched = {
+        ("menu_price" if column == "price" else column): value
+        for column, value in row.items()
+    }
+    for column, key in VIVINO_COLUMNS.items():
+        enriched[column] = wine_data[key] if wine_data else "N/A"
+    return enriched
+
+
+def vivino_search_iter(
+    df, max_workers=4, rate=1.0, cache=None, limiter=None, retries=3, catalog=None
+):
+    """
+    Look up every wine in the dataframe on Vivino, yielding rows as they finish
+
+    Args:
+        df (pd.DataFrame): Scanned wine list
+        max_workers (int): Number of lookups allowed in flight at once
+        rate (float): Vivino requests per second across all workers at first (a
+            lookup makes one to three requests); the rate then adapts to how
+            Vivino responds
+        cache (LookupCache): Cache of earlier lookups (default: the shared on-disk
+            cache), or False to always search Vivino
+        limiter (AdaptiveRateLimiter): Rate limiter shared with other searches
+            running at the same time (default: a new one starting at rate)
+        retries (int): Times a wine is retried after throttling or a failed request
+        catalog (WineCatalog): Harvested Vivino wines matched before searching live
+            (default: the shared catalog if one was harvested), or False to always
+            search Vivino
+
+    Yields:
+        tuple: (position, enriched_row) in completion order, where position is
+            the row's position in df
+    """
+    # Serve wines looked up before from the on-disk cache
+    if cache is None:
+        cache = LookupCache()
+
+    # Share one rate limiter between all workers; it speeds up while Vivino keeps
+    # answering and backs off when it throttles
+    if limiter is None:
+        limiter = AdaptiveRateLimiter(rate=rate, burst=max_workers)
+
+    # Match against the harvested catalog first; only misses are searched live
+    if catalog is None:
+        catalog = WineCatalog() if os.path.exists(CATALOG_PATH) else False
+
+    def search(kwargs):
+        key = wine_key(
+            kwargs["producer"], kwargs["name"], kwargs["vintage"], kwargs["region"]
+        )
+        # Rows with no producer, name or vintage would all share one cache entry
+        cached = cache and identity_key(
+            kwargs["producer"], kwargs["name"], kwargs["vintage"]
+        ).strip("|")
+
+        with span("vivino.lookup") as current:
+            # Cached results skip the network and the rate limiter entirely
+            if cached:
+                wine_data = cache.get(key)
+                if wine_data is not None:
+                    current.count("cache_hits")
+                    return wine_data
+
+            # Catalog matches are cached too, so a rerun skips the match as well
+            if catalog:
+                wine_data = catalog.match(
+                    kwargs["producer"], kwargs["name"], kwargs["vintage"]
+                )
+                if wine_data is not None:
+                    current.count("catalog_hits")
+                    if cached:
+                        cache.set(key, wine_data)
+                    return wine_data
+
+            wine_data = None
+            for attempt in range(retries + 1):
+                # "Not found" is a good answer; only throttling and errors are
+                # retried. Each request takes its own token and reports its outcome.
+                try:
+                    wine_data = vivino_search(**kwargs, limiter=limiter)
+                except Throttled:
+                    current.count("throttled")
+                    continue
+                except REQUEST_ERRORS + (ServerError,) as e:
+                    print(f"Vivino request failed: {str(e)}")
+                    current.count("errors")
+                    continue
+                break
+            else:
+                print(f"Giving up on {kwargs['producer']} {kwargs['name']}")
+
+            current.count("retries", attempt)
+            if cached and wine_data:
+                cache.set(key, wine_data)
+            if not wine_data:
+                current.count("failures")
+
+        return wine_data
+
+    def lookup(kwargs):
+        key = identity_key(kwargs["producer"], kwargs["name"], kwargs["vintage"])
+
+        # Rows with nothing to identify them are never shared with another search
+        if not key.strip("|"):
+            return search(kwargs)
+
+        # Wait for the same wine if another search (e.g. another menu) has it in flight
+        with _inflight_lock:
+            shared = _inflight.get(key)
+            owner = shared is None
+            if owner:
+                shared = Future()
+                _inflight[key] = shared
+        if not owner:
+            return shared.result()
+
+        try:
+            wine_data = search(kwargs)
+            shared.set_result(wine_data)
+            return wine_data
+        except Exception as e:
+            shared.set_exception(e)
+            raise
+        finally:
+            with _inflight_lock:
+                _inflight.pop(key, None)
+
+    rows = [row.to_dict() for _, row in df.iterrows()]
+    search_kwargs = [_row_search_kwargs(row) for row in rows]
+
+    # Group rows that are the same wine (e.g. by the glass and by the bottle)
+    groups = {}
+    for position, kwargs in enumerate(search_kwargs):
+        key = identity_key(kwargs["producer"], kwargs["name"], kwargs["vintage"])
+        # Rows with nothing to identify them are never grouped
+        if not key.strip("|"):
+            key = f"row-{position}"
+        groups.setdefault(key, []).append(position)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(lookup, search_kwargs[positions[0]]): positions
+            for positions in groups.values()
+        }
+        for future in tqdm(as_completed(futures), total=len(futures)):
+            positions = futures[future]
+            try:
+                wine_data = future.result()
+            except Exception as e:
+                print(f"Error searching wine {positions[0]}: {str(e)}")
+                wine_data = None
+
+            # Fan the result out, with the multiplier from each row's own menu price
+            for position in positions:
+                row_data = None
+                if wine_data:
+                    row_data = dict(wine_data)
+                    row_data["price_multiplier"] = compute_price_multiplier(
+                        search_kwargs[position]["menu_price"], wine_data["price"]
+                    )
+                yield position, enrich_row(rows[position], row_data)
+
+
 # Get wine data for all wines in the dataframe
-def vivino_search_all(df):
+@traced("ratings")
+def vivino_search_all(
+    df,
+    max_workers=4,
+    rate=1.0,
+    progress=None,
+    cache=None,
+    partial_path=None,
+    checkpoint=None,
+    limiter=None,
+    catalog=None,
+):
+    """
+    Look up every wine in the dataframe on Vivino using a pool of worker threads
+
+    Args:
+        df (pd.DataFrame): Scanned wine list
+        max_workers (int): Number of lookups allowed in flight at once
+        rate (float): Vivino requests per second across all workers at first (a
+            lookup makes one to three requests); the rate then adapts to how
+            Vivino responds
+        progress (callable): Optional progress(done, total, row) callback, called
+            from the calling thread with each enriched row as it finishes
+        cache (LookupCache): Cache of earlier lookups (default: the shared on-disk
+            cache), or False to always search Vivino
+        partial_path (str): Optional CSV that finished rows are appended to as they
+            arrive, so a crash keeps the lookups done so far
+        checkpoint (str): Optional JSONL job file; rows finished by an earlier run
+            are taken from it and only the pending rows are searched
+        limiter (AdaptiveRateLimiter): Rate limiter shared with other searches
+            running at the same time (default: a new one starting at rate)
+        catalog (WineCatalog): Harvested Vivino wines matched before searching live
+            (default: the shared catalog if one was harvested), or False to always
+            search Vivino
+
+    Returns:
+        pd.DataFrame: Copy of df with the Vivino columns added, in the input row order
+    """
     print("STARTING VIVINO SEARCH")
-    # Create a copy of the dataframe
-    new_df = df.copy()
 
-    # Create lists to store the results
-    food_pairings = []
-    prices = []
-    price_multipliers = []
-    ratings = []
-    num_ratings = []
-    links = []
-
-    # Set fail count to quite if 5 fails in a row
-    fail_count = 0
-
-    # Iterate over each row in the dataframe
-    for index, row in tqdm(new_df.iterrows(), total=len(new_df)):
-        # Get wine data
-        wine_data = vivino_search(
-            name=row["name"] if "name" in row and pd.notna(row["name"]) else " ",
-            producer=(
-                row["producer"]
-                if "producer" in row and pd.notna(row["producer"])
-                else " "
-            ),
-            type=row["type"] if "type" in row and pd.notna(row["type"]) else " ",
-            region=(
-                row["region"] if "region" in row and pd.notna(row["region"]) else " "
-            ),
-            country=(
-                row["country"] if "country" in row and pd.notna(row["country"]) else " "
-            ),
-            vintage=(
-                row["vintage"] if "vintage" in row and pd.notna(row["vintage"]) else " "
-            ),
-            menu_price=(
-                row["price"] if "price" in row and pd.notna(row["price"]) else " "
-            ),
-        )
+    # Results are stored by position so the output keeps the input row order
+    results = [None] * len(df)
+    done = 0
 
-        # Append the data to the list
-        if wine_data:
-            food_pairings.append(wine_data["food_pairings"])
-            prices.append(wine_data["price"])
-            ratings.append(wine_data["rating"])
-            links.append(wine_data["link"])
-            price_multipliers.append(wine_data["price_multiplier"])
-            num_ratings.append(wine_data["num_ratings"])
-            fail_count = 0
+    if partial_path is not None and os.path.exists(partial_path):
+        os.remove(partial_path)
+
+    def finish(position, row):
+        nonlocal done
+        done += 1
+        results[position] = row
+
+        # Append the finished row to the partial output
+        if partial_path is not None:
+            pd.DataFrame([row]).to_csv(
+                partial_path, mode="a", header=done == 1, index=False
+            )
 
+        if progress is not None:
+            progress(done, len(results), row)
+
+    # Resume from the rows an earlier run already finished
+    job = EnrichmentJob(checkpoint) if checkpoint is not None else None
+    finished = job.load() if job else {}
+    fingerprints = [row_fingerprint(row.to_dict()) for _, row in df.iterrows()]
+
+    pending = []
+    for position, fingerprint in enumerate(fingerprints):
+        if fingerprint in finished:
+            finish(position, finished[fingerprint])
         else:
-            food_pairings.append("N/A")
-            prices.append("N/A")
-            ratings.append("N/A")
-            links.append("N/A")
-            price_multipliers.append("N/A")
-            num_ratings.append("N/A")
-            fail_count += 1
-
-        if fail_count >= 5:
-            print("Failed 5 times in a row. Pausing for 3 minutes.")
-            time.sleep(180)
-
-        # Pause for three seconds to avoid rate limiting
-        time.sleep(3)
-
-    # Add the lists to the dataframe
-    new_df["food_pairings"] = food_pairings
-    new_df["vivino_price"] = prices
-    new_df["price_multiplier"] = price_multipliers
-    new_df["rating"] = ratings
-    new_df["link"] = links
-    new_df["num_ratings"] = num_ratings
+            pending.append(position)
+
+    if finished:
+        print(f"Resuming job: {len(df) - len(pending)} wines already done")
+
+    for pending_position, row in vivino_search_iter(
+        df.iloc[pending],
+        max_workers=max_workers,
+        rate=rate,
+        cache=cache,
+        limiter=limiter,
+        catalog=catalog,
+    ):
+        position = pending[pending_position]
+
+        # Only found wines are checkpointed so failed lookups are retried on rerun
+        if job and row["link"] != "N/A":
+            job.record(fingerprints[position], row)
+
+        finish(position, row)
+
+    # Rename the price column to menu_price and add the Vivino columns
+    columns = [
+        "menu_price" if column == "price" else column for column in df.columns
+    ] + list(VIVINO_COLUMNS)
+    with span("frame.assemble", rows=len(results)):
+        return normalize_enriched(
+            pd.DataFrame(results, index=df.index, columns=columns), fill=None
+        )
 
-    # Rename the price column to menu_price
-    new_df.rename(columns={"price": "menu_price"}, inplace=True)
 
+@traced("pairings")
+def fetch_food_pairings(df, max_workers=4, rate=1.0):
+    """
+    Fill in food pairings for enriched rows that were searched without them
+
+    Args:
+        df (pd.DataFrame): Output of vivino_search_all
+        max_workers (int): Number of wine pages fetched at once
+        rate (float): Pages fetched per second across all workers at first; the
+            rate then adapts to how Vivino responds
+
+    Returns:
+        pd.DataFrame: Copy of df with food_pairings (and missing Vivino prices) filled
+    """
+    new_df = df.copy()
+    limiter = AdaptiveRateLimiter(rate=rate, burst=max_workers)
+
+    # Rows with a Vivino link but no pairings yet
+    missing = new_df["food_pairings"].isna() | (new_df["food_pairings"] == "N/A")
+    has_link = new_df["link"].notna() & (new_df["link"] != "N/A")
+    todo = [position for position, flag in enumerate(missing & has_link) if flag]
+
+    def fetch(link):
+        return fetch_wine_details(link, limiter=limiter)
+
+    # Work on plain lists so list values can be stored in the pairings column
+    pairings = new_df["food_pairings"].astype(object).tolist()
+    prices = new_df["vivino_price"].astype(object).tolist()
+    multipliers = new_df["price_multiplier"].astype(object).tolist()
+    links = new_df["link"].tolist()
+    menu_prices = new_df["menu_price"].tolist()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(fetch, links[position]): position for position in todo
+        }
+        for future in tqdm(as_completed(futures), total=len(futures)):
+            position = futures[future]
+            try:
+                details = future.result()
+            except Exception as e:
+                print(f"Error fetching pairings for {links[position]}: {str(e)}")
+                continue
+            if details is None:
+                continue
+
+            pairings[position] = details["food_pairings"]
+
+            # Use the page price when the search had none
+            if str(prices[position]) in ("N/A", "nan", "-"):
+                price = clean_price(details["price"])
+                if price == "N/A":
+                    continue
+                prices[position] = price
+                multipliers[position] = compute_price_multiplier(
+                    menu_prices[position], price
+                )
+
+    new_df["food_pairings"] = pd.Series(pairings, index=new_df.index, dtype=object)
+    new_df["vivino_price"] = pd.Series(prices, index=new_df.index, dtype=object)
+    new_df["price_multiplier"] = pd.Series(
+        multipliers, index=new_df.index, dtype=object
+    )
     return new_df
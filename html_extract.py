@@ -0,0 +1,179 @@
+import json
+import re
+from html import unescape
+
+# lxml is optional: without it the card is parsed with BeautifulSoup, which is
+# slower but only ever sees the one card, never the whole page
+try:
+    import lxml.html
+
+    HAS_LXML = True
+except ImportError:
+    from bs4 import BeautifulSoup
+
+    HAS_LXML = False
+
+# Tags with a class attribute, to find an element by its classes without a DOM
+CLASS_ATTR = re.compile(r"<([a-zA-Z][\w-]*)\b[^>]*?\bclass\s*=\s*[\"']([^\"']*)[\"']")
+
+LD_JSON = re.compile(
+    r"<script[^>]*type=[\"']application/ld\+json[\"'][^>]*>(.*?)</script>",
+    re.DOTALL | re.IGNORECASE,
+)
+ARIA_LABEL = re.compile(r"<a\b[^>]*?\baria-label=\"([^\"]*)\"")
+PPC_PRICE = re.compile(
+    r"class=\"[^\"]*purchaseAvailabilityPPC__amount--2_4GT[^\"]*\"[^>]*>([^<]*)<"
+)
+
+SEARCH_CARD = ("card", "card-lg")
+FOOD_CONTAINER = ("foodPairing__foodContainer--1bvxM",)
+
+
+def find_element(html: str, classes):
+    """
+    Source of the first element carrying every class in classes
+
+    The element is found with plain string search and a regex, and its end by
+    counting nested tags of the same name, so the rest of the page is never parsed.
+
+    Args:
+        html (str): Page source
+        classes (tuple): Class names the element must have
+
+    Returns:
+        str: The element's source, or None if no element matches
+    """
+    # Jump between occurrences of the last class name instead of scanning every tag
+    for found in re.finditer(re.escape(classes[-1]), html):
+        match = CLASS_ATTR.match(html, html.rfind("<", 0, found.start()))
+        if not match or not set(classes).issubset(match.group(2).split()):
+            continue
+
+        tag = match.group(1).lower()
+        nested = re.compile(rf"<(/?){tag}\b[^>]*>", re.IGNORECASE)
+        depth = 0
+        for piece in nested.finditer(html, match.start()):
+            depth += -1 if piece.group(1) else 1
+            if depth == 0:
+                return html[match.start() : piece.end()]
+        # Unclosed element: keep everything after it
+        return html[match.start() :]
+    return None
+
+
+def _class_xpath(*classes):
+    # XPath for descendants with all of the classes, like the CSS selector .a.b
+    tests = " and ".join(
+        f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+        for name in classes
+    )
+    return f".//*[{tests}]"
+
+
+def _card_fields_lxml(card_html):
+    card = lxml.html.fragment_fromstring(card_html, create_parent="div")
+
+    def text(xpath):
+        found = card.xpath(xpath)
+        return found[0].text_content().strip() if found else None
+
+    region_box = _class_xpath("wine-card__region")
+    link = card.xpath(".//a/@href")
+    return {
+        "name": text(_class_xpath("wine-card__name")),
+        "href": link[0] if link else None,
+        "country": text(region_box + "//*[@data-item-type='country']"),
+        "region": text(region_box + _class_xpath("link-color-alt-grey")[1:]),
+        "rating": text(_class_xpath("average__number")),
+        "ratings_text": text(_class_xpath("text-micro")),
+        "price": text(_class_xpath("wine-price-value")),
+    }
+
+
+def _card_fields_soup(card_html):
+    card = BeautifulSoup(card_html, "html.parser")
+
+    def text(selector):
+        found = card.select_one(selector)
+        return found.text.strip() if found else None
+
+    link = card.select_one("a")
+    return {
+        "name": text(".wine-card__name"),
+        "href": link.get("href") if link else None,
+        "country": text(".wine-card__region [data-item-type='country']"),
+        "region": text(".wine-card__region .link-color-alt-grey"),
+        "rating": text(".average__number"),
+        "ratings_text": text(".text-micro"),
+        "price": text(".wine-price-value"),
+    }
+
+
+def parse_search_card(html: str):
+    """
+    Read the first wine card of a Vivino search page
+
+    Args:
+        html (str): Search page source
+
+    Returns:
+        dict: name, link, country, region, rating, num_ratings and price as text
+            ("N/A" for rating, num_ratings and price when missing), or None if the
+            page has no card or the card is missing its name, link or region
+    """
+    card_html = find_element(html, SEARCH_CARD)
+    if card_html is None:
+        return None
+
+    fields = _card_fields_lxml(card_html) if HAS_LXML else _card_fields_soup(card_html)
+    if None in (fields["name"], fields["href"], fields["country"], fields["region"]):
+        return None
+
+    ratings_text = fields["ratings_text"]
+    return {
+        "name": fields["name"],
+        "link": "https://www.vivino.com" + fields["href"],
+        "country": fields["country"],
+        "region": fields["region"],
+        "rating": fields["rating"] if fields["rating"] is not None else "N/A",
+        "num_ratings": (
+            ratings_text.split(" ratings")[0].strip()
+            if ratings_text is not None
+            else "N/A"
+        ),
+        "price": fields["price"] if fields["price"] is not None else "N/A",
+    }
+
+
+def parse_wine_page(html: str):
+    """
+    Read the food pairings and listed price of a Vivino wine page without a DOM
+
+    The price comes from the ld+json blob, or the purchase box when the blob has
+    none; the pairings are the aria-labels of the links in the pairing box.
+
+    Args:
+        html (str): Wine page source
+
+    Returns:
+        dict: "food_pairings" list and "price" string ("N/A" if not listed)
+    """
+    container = find_element(html, FOOD_CONTAINER)
+    food_pairings = (
+        [unescape(label) for label in ARIA_LABEL.findall(container)]
+        if container
+        else []
+    )
+
+    price = "N/A"
+    blob = LD_JSON.search(html)
+    try:
+        price = json.loads(blob.group(1)).get("offers", {}).get("price")
+        if price is None:
+            amount = PPC_PRICE.search(html)
+            price = amount.group(1).strip() if amount else "N/A"
+    except (AttributeError, TypeError, ValueError):
+        print("Error extracting price")
+        price = "N/A"
+
+    return {"food_pairings": food_pairings, "price": str(price)}
@@ -0,0 +1,135 @@
+import threading
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from tracing import span
+
+# httpx (with h2) is optional and only used for HTTP/2
+try:
+    import httpx
+    import h2  # noqa: F401
+
+    HTTP2_AVAILABLE = True
+except ImportError:
+    httpx = None
+    HTTP2_AVAILABLE = False
+
+VIVINO_URL = "https://www.vivino.com"
+
+# No Connection header: both clients keep connections alive already, and HTTP/2
+# rejects connection-specific headers
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:66.0) Gecko/20100101 Firefox/66.0",
+    "Accept-Encoding": "gzip, deflate",
+}
+
+# Errors raised by either backend when a request fails
+REQUEST_ERRORS = (requests.RequestException,) + (
+    (httpx.HTTPError,) if httpx is not None else ()
+)
+
+
+class HttpClient:
+    def __init__(
+        self,
+        base_url: str = VIVINO_URL,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 20.0,
+        pool_size: int = 16,
+        http2: bool = True,
+        transport=None,
+    ):
+        """
+        Shared HTTP client for every Vivino call, reusing connections between requests
+
+        Args:
+            base_url (str): Where requests for www.vivino.com are sent; point this at a
+                local stand-in server to replay recorded responses
+            connect_timeout (float): Seconds to wait for a connection
+            read_timeout (float): Seconds to wait for the response
+            pool_size (int): Number of keep-alive connections kept open
+            http2 (bool): Use HTTP/2 when httpx and h2 are installed
+            transport: Optional requests adapter (or httpx transport when using
+                HTTP/2) that handles requests instead of the network
+        """
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.http2 = http2 and HTTP2_AVAILABLE
+
+        if self.http2:
+            self.session = httpx.Client(
+                http2=True,
+                headers=DEFAULT_HEADERS,
+                timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+                limits=httpx.Limits(
+                    max_connections=pool_size, max_keepalive_connections=pool_size
+                ),
+                follow_redirects=True,
+                transport=transport,
+            )
+        else:
+            self.session = requests.Session()
+            self.session.headers.update(DEFAULT_HEADERS)
+            adapter = transport or HTTPAdapter(
+                pool_connections=pool_size, pool_maxsize=pool_size
+            )
+            self.session.mount("https://", adapter)
+            self.session.mount("http://", adapter)
+
+    def _rewrite(self, url: str):
+        # Send www.vivino.com requests to the configured base url
+        if url.startswith(VIVINO_URL):
+            return self.base_url + url[len(VIVINO_URL) :]
+        return url
+
+    def get(self, url: str, params=None, headers=None):
+        """
+        Send a GET request through the pooled session
+
+        Args:
+            url (str): Full URL
+            params (dict): Query parameters
+            headers (dict): Extra headers for this request
+
+        Returns:
+            Response with status_code, text, headers and json()
+        """
+        url = self._rewrite(url)
+        with span("http.get", path=urlparse(url).path) as current:
+            if self.http2:
+                response = self.session.get(url, params=params, headers=headers)
+            else:
+                response = self.session.get(
+                    url, params=params, headers=headers, timeout=self.timeout
+                )
+            current.set(status=response.status_code)
+            current.count("bytes", len(response.content))
+            return response
+
+    def close(self):
+        """Close the pooled connections"""
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Return the shared client, creating it on first use"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient()
+        return _client
+
+
+def set_client(client):
+    """Replace the shared client, e.g. with one pointed at a local stand-in server"""
+    global _client
+    with _client_lock:
+        if _client is not None and _client is not client:
+            _client.close()
+        _client = client
@@ -0,0 +1,78 @@
+import hashlib
+import json
+import os
+import threading
+
+
+def _json_default(value):
+    # numpy scalars from pandas rows know how to turn into plain python values
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+def row_fingerprint(row: dict):
+    """
+    Hash a scanned menu row so a finished lookup can be matched on rerun
+
+    Args:
+        row (dict): Scanned menu row
+
+    Returns:
+        str: Hex digest of the row's contents
+    """
+    payload = json.dumps(row, sort_keys=True, default=_json_default)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class EnrichmentJob:
+    def __init__(self, path: str):
+        """
+        Append-only JSONL checkpoint of finished Vivino lookups for one upload
+
+        Args:
+            path (str): Location of the checkpoint file, e.g. ./temp/jobs/{upload_id}.jsonl
+        """
+        self.path = path
+        self.lock = threading.Lock()
+
+        # Make sure the jobs folder exists
+        folder = os.path.dirname(path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+
+    def load(self):
+        """
+        Read the rows finished by earlier runs
+
+        Returns:
+            dict: Enriched rows keyed by the fingerprint of their scanned row
+        """
+        finished = {}
+        if not os.path.exists(self.path):
+            return finished
+
+        with open(self.path, "r") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A run killed mid-write can leave a partial last line
+                    continue
+                finished[entry["fingerprint"]] = entry["row"]
+        return finished
+
+    def record(self, fingerprint: str, row: dict):
+        """Append one finished row to the checkpoint"""
+        line = json.dumps(
+            {"fingerprint": fingerprint, "row": row}, default=_json_default
+        )
+        with self.lock:
+            with open(self.path, "a") as f:
+                f.write(line + "\n")
+                f.flush()
+
+    def clear(self):
+        """Delete the checkpoint so the next run starts over"""
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,139 @@
+import re
+
+from cache import normalize_text
+
+# Rough Gemini token estimate for menu text
+CHARS_PER_TOKEN = 4
+
+PAGE_MARKER = "--- PAGE {} ---"
+
+
+def estimate_tokens(text: str):
+    """Approximate number of tokens in text"""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+class PagePacker:
+    def __init__(self, max_tokens: int = 2500):
+        """
+        Pack pages into chunks sized to a token budget, as pages arrive
+
+        Short pages are grouped together, with a page marker before each one.
+        Long pages are split at line boundaries.
+
+        Args:
+            max_tokens (int): Token budget for the page text in one request
+        """
+        self.max_tokens = max_tokens
+        self.pending = []
+        self.pending_tokens = 0
+
+    def _chunk(self, parts):
+        # parts is a list of (page_num, text)
+        pages = [page_num for page_num, _ in parts]
+        if len(set(pages)) == 1:
+            text = "\n".join(text for _, text in parts)
+        else:
+            text = "\n".join(
+                PAGE_MARKER.format(page_num) + "\n" + text for page_num, text in parts
+            )
+        return {
+            "pages": sorted(set(pages)),
+            "text": text,
+            "page_texts": dict(parts),
+        }
+
+    def _split(self, page_num, text):
+        # Split a page that is over budget into line-aligned pieces
+        pieces = []
+        lines = []
+        tokens = 0
+        for line in text.splitlines():
+            line_tokens = estimate_tokens(line)
+            if lines and tokens + line_tokens > self.max_tokens:
+                pieces.append((page_num, "\n".join(lines)))
+                lines, tokens = [], 0
+            lines.append(line)
+            tokens += line_tokens
+        if lines:
+            pieces.append((page_num, "\n".join(lines)))
+        return pieces
+
+    def add(self, page_num: int, text: str):
+        """
+        Add a page and return the chunks that are now full
+
+        Args:
+            page_num (int): Page number
+            text (str): Text of the page
+
+        Returns:
+            list: Chunks ready to send, each a dict with "pages", "text" and "page_texts"
+        """
+        ready = []
+        tokens = estimate_tokens(text)
+
+        # Long pages are sent on their own, split at line boundaries
+        if tokens > self.max_tokens:
+            ready.extend(self.flush())
+            ready.extend(self._chunk([piece]) for piece in self._split(page_num, text))
+            return ready
+
+        if self.pending and self.pending_tokens + tokens > self.max_tokens:
+            ready.extend(self.flush())
+
+        self.pending.append((page_num, text))
+        self.pending_tokens += tokens
+        return ready
+
+    def flush(self):
+        """Return the chunk holding the pages added so far, if any"""
+        if not self.pending:
+            return []
+        chunk = self._chunk(self.pending)
+        self.pending = []
+        self.pending_tokens = 0
+        return [chunk]
+
+
+def assign_pages(wines, chunk):
+    """
+    Set the "page" field of each wine parsed from a chunk
+
+    The page the model reports is used when it belongs to the chunk; otherwise the
+    wine's producer or name is looked up in the chunk's pages.
+
+    Args:
+        wines (list): Wines parsed from the chunk
+        chunk (dict): Chunk from PagePacker
+
+    Returns:
+        list: The same wines, each with a "page" number
+    """
+    pages = chunk["pages"]
+    folded = {
+        page_num: normalize_text(text) for page_num, text in chunk["page_texts"].items()
+    }
+
+    for wine in wines:
+        if len(pages) == 1:
+            wine["page"] = pages[0]
+            continue
+
+        try:
+            page_num = int(re.sub(r"\D", "", str(wine.get("page"))))
+        except ValueError:
+            page_num = None
+
+        if page_num not in pages:
+            page_num = pages[0]
+            for field in ("name", "producer"):
+                value = normalize_text(wine.get(field))
+                found = [p for p in pages if value and value in folded[p]]
+                if found:
+                    page_num = found[0]
+                    break
+        wine["page"] = page_num
+
+    # Keep the wines in page order, and in model order within a page
+    return sorted(wines, key=lambda wine: wine["page"])
@@ -0,0 +1,131 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import PyPDF2
+
+# Workers are spawned, not forked: callers run other threads (Gemini and Vivino
+# workers), and forking a process with running threads can deadlock the child
+MP_CONTEXT = multiprocessing.get_context("spawn")
+
+# Pages a PDF needs before extracting it in several processes pays for starting
+# them
+PARALLEL_MIN_PAGES = 24
+
+
+def _extract_page_range(pdf_path, start, stop):
+    """
+    Extract pages start..stop-1 (0-based) in a worker process
+
+    Returns:
+        list: (page_number, text) pairs, with "" for pages that failed
+    """
+    results = []
+    with open(pdf_path, "rb") as file:
+        reader = PyPDF2.PdfReader(file)
+        for index in range(start, stop):
+            # A corrupt page only loses its own text
+            try:
+                text = reader.pages[index].extract_text()
+            except Exception as e:
+                print(f"Error extracting page {index + 1} of {pdf_path}: {str(e)}")
+                text = ""
+            results.append((index + 1, text))
+    return results
+
+
+def count_pages(pdf_path):
+    """Number of pages in a PDF"""
+    with open(pdf_path, "rb") as file:
+        return len(PyPDF2.PdfReader(file).pages)
+
+
+def extract_pages_parallel(pdf_path, max_workers=None, chunk_size=4):
+    """
+    Extract every page of a PDF using a pool of processes
+
+    Args:
+        pdf_path (str): Path to the PDF file
+        max_workers (int): Number of processes (default: one per core)
+        chunk_size (int): Pages handled by a worker per task
+
+    Returns:
+        dict: Page numbers and their text, in page order
+    """
+    num_pages = count_pages(pdf_path)
+    max_workers = max_workers or os.cpu_count() or 1
+
+    # Small PDFs are not worth starting processes for
+    if num_pages <= chunk_size or max_workers <= 1:
+        return dict(_extract_page_range(pdf_path, 0, num_pages))
+
+    text_by_page = {}
+    with ProcessPoolExecutor(
+        max_workers=max_workers, mp_context=MP_CONTEXT
+    ) as executor:
+        futures = {
+            executor.submit(
+                _extract_page_range, pdf_path, start, min(start + chunk_size, num_pages)
+            ): start
+            for start in range(0, num_pages, chunk_size)
+        }
+        for future in as_completed(futures):
+            start = futures[future]
+            try:
+                text_by_page.update(future.result())
+            except Exception as e:
+                # Keep the other chunks if a worker dies
+                print(
+                    f"Error extracting pages from {start + 1} of {pdf_path}: {str(e)}"
+                )
+                for page_num in range(
+                    start + 1, min(start + chunk_size, num_pages) + 1
+                ):
+                    text_by_page[page_num] = ""
+
+    return dict(sorted(text_by_page.items()))
+
+
+def _extract_whole_pdf(pdf_path):
+    # Worker for folder extraction: one PDF per task
+    return _extract_page_range(pdf_path, 0, count_pages(pdf_path))
+
+
+def extract_folder(folder, max_workers=None, skip=()):
+    """
+    Extract every PDF in a folder, one PDF per process
+
+    Args:
+        folder (str): Folder of PDFs, e.g. menus/
+        max_workers (int): Number of processes (default: one per core)
+        skip (set): PDF paths to leave out, e.g. ones already extracted
+
+    Returns:
+        dict: PDF path to a dict of page numbers and text, or None if the PDF
+            could not be read
+    """
+    pdf_paths = sorted(
+        os.path.join(folder, name)
+        for name in os.listdir(folder)
+        if name.lower().endswith(".pdf") and os.path.join(folder, name) not in skip
+    )
+    if not pdf_paths:
+        return {}
+
+    results = {}
+    with ProcessPoolExecutor(
+        max_workers=max_workers, mp_context=MP_CONTEXT
+    ) as executor:
+        futures = {
+            executor.submit(_extract_whole_pdf, pdf_path): pdf_path
+            for pdf_path in pdf_paths
+        }
+        for future in as_completed(futures):
+            pdf_path = futures[future]
+            try:
+                results[pdf_path] = dict(future.result())
+            except Exception as e:
+                print(f"Error extracting {pdf_path}: {str(e)}")
+                results[pdf_path] = None
+
+    return {pdf_path: results[pdf_path] for pdf_path in pdf_paths}
@@ -0,0 +1,250 @@
+import re
+
+# One wine per line: body, then vintage (or NV), then an optional region and the
+# price, or a "glass | bottle" price pair. Lowercase words glued to the price are
+# a page footer such as "red (continued)" that PyPDF2 ran into the last line.
+WINE_LINE = re.compile(
+    r"^(?P<body>.+?)\s+(?P<vintage>(?:19|20)\d{2}|N\.?V\.?)"
+    r"(?:\s+(?P<region>[^\d|]*?[^\d\s|]))?"
+    r"\s+(?P<price>\d{1,5}(?:\.\d{2})?)(?:\s*\|\s*(?P<bottle>\d{1,5}(?:\.\d{2})?))?"
+    r"(?:(?P<footer>[a-zà-ÿ]+)(?:\s*\([a-z ]+\))?)?\s*$"
+)
+
+# Producer, "Name", details   or   Producer "Name" details
+QUOTED_NAME = re.compile(
+    r'^(?P<producer>[^"“”]+?)\s*,?\s*["“](?P<name>[^"“”]+)["”]\s*,?\s*(?P<details>.*)$'
+)
+
+# Trailing country code of a region, e.g. "Southwest, FRA", or US state, e.g.
+# "Finger Lakes, NY"
+REGION_COUNTRY = re.compile(r"^(?P<region>.+?),\s*(?P<country>[A-Z]{2,3})$")
+
+# Section headings that set the main type of the wines below them
+MAIN_TYPES = {
+    "white": "WHITE",
+    "whites": "WHITE",
+    "red": "RED",
+    "reds": "RED",
+    "rose": "ROSE",
+    "rosé": "ROSE",
+    "orange": "ORANGE",
+    "sparkling": "SPARKLING",
+    "bubbles": "SPARKLING",
+    "champagne": "SPARKLING",
+    "dessert": "DESSERT",
+    "sweet": "DESSERT",
+    "fortified": "FORTIFIED",
+}
+
+# Section headings that set the country of the wines below them
+COUNTRIES = {
+    "argentina": "ARG",
+    "australia": "AUS",
+    "austria": "AUT",
+    "canada": "CAN",
+    "chile": "CHL",
+    "croatia": "HRV",
+    "england": "GBR",
+    "france": "FRA",
+    "georgia": "GEO",
+    "germany": "DEU",
+    "greece": "GRC",
+    "hungary": "HUN",
+    "israel": "ISR",
+    "italy": "ITA",
+    "japan": "JPN",
+    "lebanon": "LBN",
+    "mexico": "MEX",
+    "new zealand": "NZL",
+    "portugal": "PRT",
+    "serbia": "SRB",
+    "slovakia": "SVK",
+    "slovenia": "SVN",
+    "south africa": "ZAF",
+    "spain": "ESP",
+    "switzerland": "CHE",
+    "uruguay": "URY",
+    "usa": "USA",
+}
+
+
+class RuleWineParser:
+    def __init__(self, min_confidence: float = 0.8, min_wines: int = 3):
+        """
+        Parse well-structured menu pages locally with regular expressions
+
+        Handles the common layout of one wine per line, written as
+        'Producer, "Name" details vintage region price' under type or country
+        headings. Each page gets a confidence score; pages below min_confidence
+        are meant to go to Gemini instead.
+
+        Args:
+            min_confidence (float): Score a page needs to be trusted
+            min_wines (int): Wines a page needs to be trusted
+        """
+        self.min_confidence = min_confidence
+        self.min_wines = min_wines
+
+    def _heading(self, line):
+        # (main_type, country) a heading line sets, (None, None) for a heading that
+        # is neither, or None if it is not a heading
+        if any(char.isdigit() for char in line) or len(line.split()) > 4:
+            return None
+        words = line.lower().strip(" :-")
+        if words in MAIN_TYPES:
+            return MAIN_TYPES[words], None
+        # "California - USA" sets the country after the dash
+        country = words.rsplit(" - ", 1)[-1].strip()
+        if country in COUNTRIES:
+            return None, COUNTRIES[country]
+        return None, None
+
+    def _wine(self, match):
+        # Producer, name and type from the body of a wine line; quoted is False
+        # when the name could only be guessed from the first comma
+        body = match.group("body").strip()
+        quoted = QUOTED_NAME.match(body)
+        if quoted:
+            producer = quoted.group("producer").strip()
+            name = quoted.group("name").strip()
+            details = quoted.group("details").strip(" ,")
+            return producer, name, details or None, True
+        if "," in body:
+            producer, name = body.split(",", 1)
+            return producer.strip(), name.strip(), None, False
+        return None, body, None, False
+
+    def parse_page(self, text: str, page_num=None, context=None):
+        """
+        Parse the wines on one page and score how well the page fits the layout
+
+        The confidence is the share of the page's non-heading lines that were read
+        as a wine with a producer, scaled down when fewer than half of the wines
+        have a quoted name (the part of the layout that tells the producer and the
+        name apart) and by the share of wines whose main type is known.
+
+        Wines above the page's first type heading get the type of the page
+        footer, or the type the previous page ended on when the page has no type
+        heading of its own (a continued section).
+
+        Args:
+            text (str): Page text
+            page_num (int): Page number to put on each wine
+            context (dict): Headings carried over from the previous page, updated
+                in place with the headings this page ends on
+
+        Returns:
+            tuple: (wines, confidence) with wines in the same format as
+                GeminiWineParser.parse_wine_list and confidence between 0 and 1
+        """
+        if context is None:
+            context = {}
+        wines = []
+        main_type, country = None, context.get("country")
+        glass = context.get("glass", False)
+        footer = None
+        wine_lines, split_lines, quoted_lines, other_lines = 0, 0, 0, 0
+
+        for line in text.splitlines():
+            line = " ".join(line.split())
+            if not line:
+                continue
+
+            match = WINE_LINE.match(line)
+            if not match:
+                # "Wines by the Glass" and "Bottles" headings set the size below them
+                lowered = line.lower()
+                digits = any(char.isdigit() for char in line)
+                heading = self._heading(line)
+                if "glass" in lowered and not digits:
+                    glass = True
+                elif "bottle" in lowered and not digits:
+                    glass = False
+                elif heading is None:
+                    other_lines += 1
+                elif heading[0] is not None:
+                    # A type heading starts a new section with its own countries
+                    main_type, country = heading[0], None
+                else:
+                    # Unknown headings (e.g. a country missing from COUNTRIES)
+                    # must not leave the previous country on the wines below
+                    country = heading[1]
+                continue
+
+            if match.group("footer") in MAIN_TYPES:
+                footer = MAIN_TYPES[match.group("footer")]
+
+            producer, name, details, quoted = self._wine(match)
+            wine_lines += 1
+            split_lines += producer is not None
+            quoted_lines += quoted
+
+            region = match.group("region")
+            wine_country = country
+            if region:
+                region_country = REGION_COUNTRY.match(region)
+                if region_country:
+                    region = region_country.group("region")
+                    wine_country = region_country.group("country")
+                    if len(wine_country) == 2:
+                        wine_country = "USA"
+
+            vintage = match.group("vintage")
+            wine = {
+                "id": None,
+                "producer": producer,
+                "name": name,
+                "type": details,
+                "main_type": main_type,
+                "region": region,
+                "country": wine_country,
+                "vintage": vintage if vintage[0].isdigit() else None,
+                "price": match.group("price"),
+                "size": "glass" if glass else "bottle",
+                "page": page_num,
+            }
+            # "12 | 48" is the price by the glass and by the bottle
+            if match.group("bottle"):
+                wines.append({**wine, "size": "glass"})
+                wine = {**wine, "price": match.group("bottle"), "size": "bottle"}
+            wines.append(wine)
+
+        # Only wines above the first type heading can still be missing a type
+        page_type = footer or (context.get("main_type") if main_type is None else None)
+        for wine in wines:
+            if wine["main_type"] is None:
+                wine["main_type"] = page_type
+        context.update(main_type=main_type or page_type, country=country, glass=glass)
+
+        typed = sum(wine["main_type"] is not None for wine in wines)
+        confidence = self._confidence(
+            wine_lines, split_lines, quoted_lines, other_lines
+        )
+        return wines, confidence * (typed / len(wines) if wines else 0.0)
+
+    def _confidence(self, wine_lines, split_lines, quoted_lines, other_lines):
+        # Share of lines read as a wine with a producer, scaled by how many of
+        # them had a quoted name (a comma alone cannot tell "Producer, Name"
+        # from "Name, Producer"); 0 for pages with too few wines
+        if wine_lines < self.min_wines:
+            return 0.0
+        confidence = split_lines / (wine_lines + other_lines)
+        return confidence * min(1.0, 2 * quoted_lines / wine_lines)
+
+    def parse(self, text: str, page_num=None, context=None):
+        """
+        Wines on a page if the page is parsed with enough confidence
+
+        Args:
+            text (str): Page text
+            page_num (int): Page number to put on each wine
+            context (dict): Headings carried over from the previous page (see
+                parse_page)
+
+        Returns:
+            list: Parsed wines, or None if the page should go to Gemini
+        """
+        wines, confidence = self.parse_page(text, page_num, context)
+        if confidence < self.min_confidence:
+            return None
+        return wines
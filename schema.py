@@ -0,0 +1,112 @@
+import math
+import re
+import sys
+import unicodedata
+
+import pandas as pd
+
+# Every Unicode currency symbol ($, €, ₩, ₹, ...); re has no \p{Sc}
+CURRENCY_SYMBOLS = "".join(
+    chr(code)
+    for code in range(sys.maxunicode + 1)
+    if unicodedata.category(chr(code)) == "Sc"
+)
+
+# Currency symbols and codes written around a number
+CURRENCY = re.compile(
+    f"[{re.escape(CURRENCY_SYMBOLS)}]"
+    r"|\b(?:USD|EUR|GBP|CHF|JPY|KRW|INR|AUD|CAD|NZD|HKD|SGD|Rs\.?)(?=[\s\d]|$)"
+)
+
+# Comma between thousands, e.g. "1,234"
+THOUSANDS = re.compile(r"(?<=\d),(?=\d{3}(?!\d))")
+
+# Decimal comma, e.g. "12,50"
+DECIMAL_COMMA = re.compile(r"^(-?\d+),(\d{1,2})$")
+
+# Columns that hold numbers, possibly written as "N/A", "-", "$45" or "1,234"
+SCANNED_NUMERIC = ["price"]
+ENRICHED_NUMERIC = [
+    "menu_price",
+    "vivino_price",
+    "price_multiplier",
+    "num_ratings",
+    "rating",
+]
+
+# Low-cardinality text columns stored as categoricals
+CATEGORICAL = ["main_type", "size", "type", "region", "country"]
+
+
+def to_number(series: pd.Series):
+    """
+    Vectorized conversion of a column of prices, ratings or counts to floats
+
+    Currency symbols, surrounding spaces and thousands separators are stripped and
+    a decimal comma ("12,50") is read as a decimal point; anything that is still
+    not a single number ("N/A", "-", "12/45", "2019 45") becomes NaN rather than
+    a different number.
+
+    Args:
+        series (pd.Series): Column to convert
+
+    Returns:
+        pd.Series: Float column
+    """
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype(float)
+    cleaned = (
+        series.astype(str)
+        .str.replace(CURRENCY, "", regex=True)
+        .str.strip()
+        .str.replace(THOUSANDS, "", regex=True)
+        .str.replace(DECIMAL_COMMA, r"\1.\2", regex=True)
+    )
+    return pd.to_numeric(cleaned, errors="coerce")
+
+
+def clean_price(value):
+    """Scalar version of to_number for a single price; "N/A" if not a number"""
+    cleaned = CURRENCY.sub("", str(value)).strip()
+    cleaned = DECIMAL_COMMA.sub(r"\1.\2", THOUSANDS.sub("", cleaned))
+    try:
+        price = float(cleaned)
+    except ValueError:
+        return "N/A"
+    # float() also reads "nan" and "inf"
+    return price if math.isfinite(price) else "N/A"
+
+
+def normalize(df: pd.DataFrame, numeric=(), fill=None):
+    """
+    Coerce numeric columns and turn the low-cardinality text columns into categoricals
+
+    Args:
+        df (pd.DataFrame): Frame to normalize
+        numeric (list): Numeric columns to coerce (missing columns are skipped)
+        fill (float): Value for numbers that could not be parsed (default: leave NaN)
+
+    Returns:
+        pd.DataFrame: Normalized copy of df
+    """
+    df = df.copy()
+    for column in numeric:
+        if column in df.columns:
+            df[column] = to_number(df[column])
+            if fill is not None:
+                df[column] = df[column].fillna(fill)
+
+    for column in CATEGORICAL:
+        if column in df.columns:
+            df[column] = df[column].astype("category")
+    return df
+
+
+def normalize_scanned(df: pd.DataFrame):
+    """Normalize a scanned menu; unparseable prices become 0"""
+    return normalize(df, SCANNED_NUMERIC, fill=0)
+
+
+def normalize_enriched(df: pd.DataFrame, fill=0):
+    """Normalize an enriched menu; unparseable numbers become fill (default: 0)"""
+    return normalize(df, ENRICHED_NUMERIC, fill=fill)
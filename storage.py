@@ -0,0 +1,133 @@
+import ast
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from schema import ENRICHED_NUMERIC, SCANNED_NUMERIC, normalize
+
+# Columns that hold a list per wine
+LIST_COLUMNS = ["food_pairings"]
+
+
+def parse_list(value):
+    """
+    Turn a stored pairings value into a list, or None if it was never fetched
+
+    Handles real lists, Arrow arrays and the "['beef', 'lamb']" strings written by
+    older CSV outputs.
+    """
+    if value is None:
+        return None
+    if isinstance(value, list):
+        return value
+    if hasattr(value, "tolist"):
+        return list(value.tolist())
+    if isinstance(value, float) or value in ("N/A", ""):
+        return None
+
+    text = str(value).strip()
+    if text.startswith("["):
+        try:
+            return [str(item) for item in ast.literal_eval(text)]
+        except (ValueError, SyntaxError):
+            text = text.strip("[]").replace("'", "")
+    return [item.strip() for item in text.split(",") if item.strip()]
+
+
+def _text_or_null(value):
+    # Keep one type per text column: everything but missing values becomes str
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return None
+    return str(value)
+
+
+def to_storage(df: pd.DataFrame):
+    """
+    Give a scanned or enriched frame the types it is stored with
+
+    Numbers become floats (NaN if missing), low-cardinality text becomes
+    categoricals, list columns hold lists, and every other column holds text.
+
+    Args:
+        df (pd.DataFrame): Frame to store
+
+    Returns:
+        pd.DataFrame: Typed copy of df
+    """
+    numeric = SCANNED_NUMERIC + ENRICHED_NUMERIC
+    df = df.copy()
+    for column in df.columns:
+        if column in LIST_COLUMNS:
+            df[column] = pd.Series(
+                [parse_list(value) for value in df[column]],
+                index=df.index,
+                dtype=object,
+            )
+        elif column not in numeric and df[column].dtype == object:
+            df[column] = df[column].map(_text_or_null)
+    return normalize(df, numeric)
+
+
+def save_table(df: pd.DataFrame, path: str):
+    """
+    Save a scanned or enriched menu
+
+    Parquet files keep list columns, typed numbers and dictionary-encoded
+    categoricals; a .csv path writes CSV for downloads and spreadsheets.
+
+    Args:
+        df (pd.DataFrame): Menu to save
+        path (str): Output path ending in .parquet or .csv
+
+    Returns:
+        str: Path written
+    """
+    folder = os.path.dirname(path)
+    if folder and not os.path.exists(folder):
+        os.makedirs(folder)
+
+    if path.endswith(".csv"):
+        df.to_csv(path, index=False)
+        return path
+
+    table = pa.Table.from_pandas(to_storage(df), preserve_index=False)
+
+    # Write next to the old file and swap, so readers never see half a file
+    temp_path = path + ".tmp"
+    pq.write_table(table, temp_path)
+    os.replace(temp_path, path)
+    return path
+
+
+def load_table(path: str, columns=None):
+    """
+    Load a menu saved by save_table, or a CSV from an older version or a download
+
+    Args:
+        path (str): Path to a .parquet or .csv file
+        columns (list): Only read these columns (Parquet only reads them from disk)
+
+    Returns:
+        pd.DataFrame: Typed menu with real lists in the list columns
+    """
+    if path.endswith(".csv"):
+        df = pd.read_csv(path, usecols=columns)
+        return to_storage(df)
+
+    # Memory-map the file so unchanged pages are shared instead of copied
+    df = pq.read_table(path, columns=columns, memory_map=True).to_pandas()
+    for column in LIST_COLUMNS:
+        if column in df.columns:
+            df[column] = pd.Series(
+                [parse_list(value) for value in df[column]],
+                index=df.index,
+                dtype=object,
+            )
+    return df
+
+
+def to_csv_bytes(df: pd.DataFrame):
+    """CSV export of a menu, with lists written as "['beef', 'lamb']" like older outputs"""
+    return df.to_csv(index=False).encode("utf-8")
@@ -0,0 +1,101 @@
+import json
+
+
+class WineStreamParser:
+    def __init__(self, key: str = "wines"):
+        """
+        Incremental parser for {"wines": [...]} responses that arrive in pieces
+
+        Each wine object is returned as soon as its closing brace arrives, so a
+        truncated response still yields every wine that was complete. Text before
+        the array, such as a ```json fence, is skipped.
+
+        Args:
+            key (str): Name of the array holding the wine objects
+        """
+        self.key = key
+        self.buffer = ""
+        self.position = 0
+        self.in_array = False
+        self.done = False
+
+        # State of the object currently being read
+        self.depth = 0
+        self.start = None
+        self.in_string = False
+        self.escaped = False
+
+    def _find_array(self):
+        # Look for the opening bracket of the wines array
+        key_at = self.buffer.find(f'"{self.key}"', self.position)
+        if key_at == -1:
+            return False
+        bracket_at = self.buffer.find("[", key_at)
+        if bracket_at == -1:
+            return False
+        self.position = bracket_at + 1
+        self.in_array = True
+        return True
+
+    def feed(self, text: str):
+        """
+        Add the next piece of the response
+
+        Args:
+            text (str): Next piece of response text
+
+        Returns:
+            list: Wine dicts completed by this piece
+        """
+        self.buffer += text
+        wines = []
+
+        if self.done or (not self.in_array and not self._find_array()):
+            return wines
+
+        while self.position < len(self.buffer):
+            char = self.buffer[self.position]
+
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char == "{":
+                if self.depth == 0:
+                    self.start = self.position
+                self.depth += 1
+            elif char == "}":
+                self.depth -= 1
+                if self.depth == 0:
+                    try:
+                        wines.append(
+                            json.loads(self.buffer[self.start : self.position + 1])
+                        )
+                    except json.JSONDecodeError:
+                        pass
+                    self.start = None
+            elif char == "]" and self.depth == 0:
+                self.done = True
+                self.position += 1
+                break
+
+            self.position += 1
+
+        # Drop text that has been fully consumed
+        keep_from = self.start if self.start is not None else self.position
+        self.buffer = self.buffer[keep_from:]
+        self.position -= keep_from
+        if self.start is not None:
+            self.start = 0
+
+        return wines
+
+
+def salvage_wines(text: str):
+    """Every complete wine object in a possibly truncated response"""
+    return WineStreamParser().feed(text)
@@ -0,0 +1,48 @@
+from packing import PAGE_MARKER, PagePacker, assign_pages, estimate_tokens
+
+
+def test_short_pages_are_packed_with_markers():
+    packer = PagePacker(max_tokens=100)
+    assert packer.add(1, "a" * 100) == []
+    assert packer.add(2, "b" * 100) == []
+    chunks = packer.flush()
+    assert len(chunks) == 1
+    assert chunks[0]["pages"] == [1, 2]
+    assert chunks[0]["text"].startswith(PAGE_MARKER.format(1))
+    assert PAGE_MARKER.format(2) in chunks[0]["text"]
+    assert packer.flush() == []
+
+
+def test_full_chunk_is_returned_before_the_next_page():
+    packer = PagePacker(max_tokens=100)
+    packer.add(1, "a" * 300)
+    chunks = packer.add(2, "b" * 300)
+    assert [chunk["pages"] for chunk in chunks] == [[1]]
+    assert chunks[0]["text"] == "a" * 300
+    assert [chunk["pages"] for chunk in packer.flush()] == [[2]]
+
+
+def test_long_page_is_split_at_lines():
+    packer = PagePacker(max_tokens=50)
+    packer.add(1, "short")
+    lines = ["x" * 80] * 6
+    chunks = packer.add(2, "\n".join(lines))
+    assert chunks[0]["pages"] == [1]
+    pieces = chunks[1:]
+    assert all(chunk["pages"] == [2] for chunk in pieces)
+    assert all(estimate_tokens(chunk["text"]) <= 50 for chunk in pieces)
+    assert "\n".join(chunk["text"] for chunk in pieces) == "\n".join(lines)
+
+
+def test_assign_pages():
+    chunk = {
+        "pages": [3, 4],
+        "page_texts": {3: "Vietti Barolo 2019 90", 4: "Gaja Barbaresco 2018 300"},
+    }
+    wines = [
+        {"producer": "Gaja", "name": "Barbaresco", "page": None},
+        {"producer": "Vietti", "name": "Barolo", "page": "Page 3"},
+        {"producer": "Unknown", "name": "Mystery", "page": 9},
+    ]
+    assert [wine["page"] for wine in assign_pages(wines, chunk)] == [3, 3, 4]
+    assert [wine["producer"] for wine in wines] == ["Gaja", "Vietti", "Unknown"]
@@ -0,0 +1,95 @@
+from rule_parser import RuleWineParser
+
+PAGE = """White
+Domaine A, "Cuvée Un", Chardonnay 2020 Burgundy, FRA 60
+Domaine B, "Cuvée Deux", Aligoté 2021 Burgundy, FRA 55
+Red
+Cantina C, "Rosso" Nebbiolo 2019 Piedmont, ITA 80
+Winery D, "Old Vines" Zinfandel NV Sonoma, CA 12 | 48"""
+
+
+def test_parse_page():
+    wines, confidence = RuleWineParser().parse_page(PAGE, 1)
+    assert confidence == 1.0
+    assert [wine["main_type"] for wine in wines] == [
+        "WHITE",
+        "WHITE",
+        "RED",
+        "RED",
+        "RED",
+    ]
+    assert wines[0]["producer"] == "Domaine A"
+    assert wines[0]["name"] == "Cuvée Un"
+    assert wines[0]["type"] == "Chardonnay"
+    assert wines[0]["region"] == "Burgundy"
+    assert wines[0]["country"] == "FRA"
+    assert wines[0]["vintage"] == "2020"
+    # "12 | 48" is a glass and a bottle
+    assert [(wine["size"], wine["price"]) for wine in wines[3:]] == [
+        ("glass", "12"),
+        ("bottle", "48"),
+    ]
+    assert wines[3]["country"] == "USA"
+    assert wines[3]["vintage"] is None
+
+
+def test_headings_carry_across_pages():
+    parser = RuleWineParser()
+    context = {}
+    parser.parse_page(
+        "Red\nItaly\n"
+        + "\n".join(
+            f'Cantina {i}, "Rosso {i}" Nebbiolo 2019 Piedmont 80' for i in range(3)
+        ),
+        1,
+        context,
+    )
+    wines, confidence = parser.parse_page(
+        "\n".join(
+            f'Cantina {i}, "Bianco {i}" Arneis 2019 Piedmont 80' for i in range(3)
+        ),
+        2,
+        context,
+    )
+    assert {(wine["main_type"], wine["country"]) for wine in wines} == {("RED", "ITA")}
+    assert confidence == 1.0
+
+
+def test_footer_sets_the_page_type():
+    parser = RuleWineParser()
+    context = {"main_type": "RED", "country": "ITA"}
+    text = "\n".join(
+        f'Domaine {i}, "Cuvée {i}" Grenache 2022 Provence 45' for i in range(3)
+    )
+    wines, _ = parser.parse_page(text + "rosé (continued)", 3, context)
+    assert {wine["main_type"] for wine in wines} == {"ROSE"}
+    assert context["main_type"] == "ROSE"
+
+
+def test_unknown_heading_resets_the_country():
+    parser = RuleWineParser()
+    text = """Red
+Germany
+Weingut A, "Spät" Pinot Noir 2020 Baden 70
+Moldova
+Winery B, "Rara Neagra" Rara Neagra 2020 Codru 40
+Winery C, "Feteasca" Feteasca Neagra 2019 Codru 42"""
+    wines, _ = parser.parse_page(text)
+    assert [wine["country"] for wine in wines] == ["DEU", None, None]
+
+
+def test_untyped_wines_lower_the_confidence():
+    parser = RuleWineParser()
+    text = "\n".join(
+        f'Domaine {i}, "Cuvée {i}" Chardonnay 2020 Burgundy, FRA 60' for i in range(4)
+    )
+    wines, confidence = parser.parse_page(text)
+    assert {wine["main_type"] for wine in wines} == {None}
+    assert confidence == 0.0
+    assert parser.parse(text) is None
+    assert parser.parse("White\n" + text) is not None
+
+
+def test_unstructured_page_goes_to_gemini():
+    text = "Our wines\nAsk your server about today's selection\nBarolo 2019 90"
+    assert RuleWineParser().parse(text) is None
@@ -0,0 +1,23 @@
+import math
+
+import pandas as pd
+
+from schema import clean_price, to_number
+
+
+def test_clean_price():
+    assert clean_price("$45") == 45.0
+    assert clean_price("₹ 500") == 500.0
+    assert clean_price("₩50000") == 50000.0
+    assert clean_price("Rs. 450") == 450.0
+    assert clean_price("45 EUR") == 45.0
+    assert clean_price("€12,50") == 12.5
+    assert clean_price("$1,234") == 1234.0
+    for value in ["N/A", "-", "12/45", "2019 45", "nan", "inf", None]:
+        assert clean_price(value) == "N/A"
+
+
+def test_to_number():
+    numbers = to_number(pd.Series(["₩50000", "£1,234.50", "12,50", "N/A", "2019 45"]))
+    assert numbers[:3].tolist() == [50000.0, 1234.5, 12.5]
+    assert all(math.isnan(number) for number in numbers[3:])
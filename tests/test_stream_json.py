@@ -0,0 +1,34 @@
+from stream_json import WineStreamParser, salvage_wines
+
+RESPONSE = (
+    '```json\n{"wines": [{"name": "Barolo", "producer": "Vietti"}, '
+    '{"name": "Say \\"hi\\" {}", "producer": "Foo"}]}\n```'
+)
+
+
+def test_wines_arrive_as_they_complete():
+    parser = WineStreamParser()
+    wines = []
+    for size in range(0, len(RESPONSE), 7):
+        wines.extend(parser.feed(RESPONSE[size : size + 7]))
+    assert wines == [
+        {"name": "Barolo", "producer": "Vietti"},
+        {"name": 'Say "hi" {}', "producer": "Foo"},
+    ]
+    assert parser.done
+
+
+def test_wine_is_returned_with_its_closing_brace():
+    parser = WineStreamParser()
+    assert parser.feed('{"wines": [{"name": "Barolo"') == []
+    assert parser.feed("}") == [{"name": "Barolo"}]
+
+
+def test_text_after_the_array_is_ignored():
+    parser = WineStreamParser()
+    assert parser.feed('{"wines": [], "other": [{"name": "x"}]}') == []
+
+
+def test_salvage_truncated_response():
+    text = '{"wines": [{"name": "A"}, {"name": "B"}, {"name": "C", "pro'
+    assert salvage_wines(text) == [{"name": "A"}, {"name": "B"}]
@@ -0,0 +1,93 @@
+import time
+
+import pytest
+
+from throttle import (
+    ERROR,
+    OK,
+    THROTTLED,
+    AdaptiveRateLimiter,
+    ServerError,
+    Throttled,
+    check_response,
+    retry_after,
+)
+
+
+class Response:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+def test_check_response():
+    check_response(Response(200))
+    check_response(Response(404))
+    with pytest.raises(Throttled) as error:
+        check_response(Response(429, {"Retry-After": "12"}))
+    assert error.value.status == 429
+    assert error.value.retry_after == 12.0
+    with pytest.raises(Throttled):
+        check_response(Response(403))
+    with pytest.raises(ServerError):
+        check_response(Response(502))
+
+
+def test_retry_after():
+    assert retry_after(Response(429)) is None
+    assert retry_after(Response(429, {"Retry-After": "-5"})) == 0.0
+    assert retry_after(Response(429, {"Retry-After": "soon"})) is None
+    date = "Wed, 21 Oct 2015 07:28:00 GMT"
+    assert retry_after(Response(429, {"Retry-After": date})) == 0.0
+
+
+def test_rate_follows_outcomes():
+    limiter = AdaptiveRateLimiter(rate=2.0, min_rate=0.5, max_rate=3.0)
+    limiter.record(OK)
+    assert limiter.rate == 2.25
+    limiter.record(THROTTLED)
+    assert limiter.rate == 1.125
+    for _ in range(3):
+        limiter.record(THROTTLED)
+    assert limiter.rate == 0.5
+    for _ in range(20):
+        limiter.record(OK)
+    assert limiter.rate == 3.0
+
+
+def test_circuit_opens_once_for_a_burst_of_failures():
+    limiter = AdaptiveRateLimiter(rate=4.0, burst=4, failure_threshold=5, cooldown=30)
+    for _ in range(8):
+        limiter.record(ERROR)
+    assert limiter.state == "open"
+    assert limiter.opened_until - time.monotonic() == pytest.approx(30, abs=1)
+    assert limiter.cooldown == 60
+
+
+def test_failures_while_open_keep_retry_after():
+    limiter = AdaptiveRateLimiter(failure_threshold=1, cooldown=30)
+    limiter.record(ERROR)
+    limiter.record(THROTTLED, retry_after=120)
+    assert limiter.opened_until - time.monotonic() == pytest.approx(120, abs=1)
+    assert limiter.cooldown == 60
+
+
+def test_probe_closes_or_reopens_the_circuit():
+    limiter = AdaptiveRateLimiter(failure_threshold=1, cooldown=30)
+    limiter.record(ERROR)
+
+    # A failed probe opens the circuit for the doubled cooldown
+    limiter.opened_until = time.monotonic()
+    limiter.acquire()
+    assert limiter.state == "half_open"
+    limiter.record(ERROR)
+    assert limiter.state == "open"
+    assert limiter.opened_until - time.monotonic() == pytest.approx(60, abs=1)
+    assert limiter.cooldown == 120
+
+    # A good probe closes it and resets the cooldown
+    limiter.opened_until = time.monotonic()
+    limiter.acquire()
+    limiter.record(OK)
+    assert limiter.state == "closed"
+    assert limiter.cooldown == 30
@@ -0,0 +1,252 @@
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+# Outcomes of a request, as far as the rate limiter is concerned
+OK = "ok"  # The site answered, whether or not the wine was found
+THROTTLED = "throttled"  # 429 or similar: slow down
+ERROR = "error"  # Server error or failed connection
+
+
+class Throttled(Exception):
+    def __init__(self, status: int, retry_after=None):
+        """
+        Raised when the site asks us to slow down
+
+        Args:
+            status (int): HTTP status of the response
+            retry_after (float): Seconds the site asked us to wait, if it said
+        """
+        super().__init__(f"Throttled with status {status}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+class ServerError(Exception):
+    def __init__(self, status: int):
+        """Raised when the site answers with a 5xx error"""
+        super().__init__(f"Server error with status {status}")
+        self.status = status
+
+
+def retry_after(response):
+    """Seconds asked for by a Retry-After header (seconds or HTTP date), or None"""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def check_response(response):
+    """
+    Raise Throttled or ServerError for responses that say nothing about the wine
+
+    429, and 403 or 503 (Vivino's answers when it blocks a client), are
+    throttling; other 5xx are server errors. Anything else is left to the caller.
+    """
+    status = response.status_code
+    if status in (403, 429, 503):
+        raise Throttled(status, retry_after(response))
+    if status >= 500:
+        raise ServerError(status)
+
+
+class TokenBucket:
+    def __init__(self, rate: float = 1.0, burst: int = 1):
+        """
+        Token bucket rate limiter shared by lookup worker threads
+
+        Args:
+            rate (float): Tokens added per second (sustained requests per second)
+            burst (int): Maximum number of tokens that can be saved up
+        """
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float):
+        # Add the tokens earned since the last refill, capped at the burst size
+        elapsed = now - self.updated
+        self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """Block until a token is available, then take it"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+
+                # Respect any pause set after repeated failures
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                else:
+                    self._refill(now)
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+    def record(self, outcome: str, retry_after=None):
+        """
+        Report how a request went; a fixed-rate bucket only honors Retry-After
+
+        Args:
+            outcome (str): OK, THROTTLED or ERROR
+            retry_after (float): Seconds the site asked us to wait, if any
+        """
+        if retry_after:
+            self.pause(retry_after)
+
+    def pause(self, seconds: float):
+        """Stop handing out tokens for the given number of seconds"""
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            # Start from an empty bucket once the pause is over
+            self.tokens = 0.0
+            self.updated = self.paused_until
+
+
+class AdaptiveRateLimiter(TokenBucket):
+    def __init__(
+        self,
+        rate: float = 1.0,
+        burst: int = 1,
+        min_rate: float = 0.2,
+        max_rate: float = 8.0,
+        increase: float = 0.25,
+        decrease: float = 0.5,
+        failure_threshold: int = 5,
+        cooldown: float = 30.0,
+        max_cooldown: float = 600.0,
+    ):
+        """
+        Token bucket whose rate follows what the site tolerates (AIMD)
+
+        Every OK response adds increase to the rate; a throttled response
+        multiplies it by decrease and waits out any Retry-After. After
+        failure_threshold throttled or failed requests in a row the circuit opens:
+        no requests are made for cooldown seconds, then a single probe request is
+        let through. A good probe closes the circuit; a bad one opens it again
+        for twice as long, up to max_cooldown.
+
+        Args:
+            rate (float): Starting requests per second
+            burst (int): Maximum number of tokens that can be saved up
+            min_rate (float): Lowest rate after decreases
+            max_rate (float): Highest rate after increases
+            increase (float): Requests per second added per OK response
+            decrease (float): Factor applied to the rate per throttled response
+            failure_threshold (int): Bad responses in a row that open the circuit
+            cooldown (float): Seconds the circuit first stays open
+            max_cooldown (float): Longest time the circuit stays open
+        """
+        super().__init__(rate=rate, burst=burst)
+        self.min_rate = min_rate
+        self.max_rate = max(max_rate, rate)
+        self.increase = increase
+        self.decrease = decrease
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+
+        self.failures = 0
+        self.state = "closed"  # closed, open or half_open
+        self.opened_until = 0.0
+        self.probing = False
+        self.probe_started = 0.0
+
+    def acquire(self):
+        """Block until a request may be made, then take a token"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                wait = None
+
+                if self.state == "open" and now >= self.opened_until:
+                    self.state = "half_open"
+                    self.probing = False
+
+                if self.state == "open":
+                    wait = self.opened_until - now
+                elif self.state == "half_open":
+                    # Only one probe at a time; the rest wait for its result, unless
+                    # the probe never reported back
+                    if (
+                        not self.probing
+                        or now - self.probe_started > self.base_cooldown
+                    ):
+                        self.probing = True
+                        self.probe_started = now
+                        return
+                    wait = 0.1
+
+            if wait is not None:
+                time.sleep(wait)
+                continue
+            return super().acquire()
+
+    def _set_rate(self, rate: float):
+        # Refill at the old rate first so tokens already earned are kept
+        self._refill(max(time.monotonic(), self.updated))
+        self.rate = min(self.max_rate, max(self.min_rate, rate))
+
+    def _open(self, now: float):
+        self.state = "open"
+        self.opened_until = now + self.cooldown
+        self.probing = False
+        print(f"Too many failed requests, pausing for {self.cooldown:g}s")
+        self.cooldown = min(self.max_cooldown, self.cooldown * 2)
+
+    def record(self, outcome: str, retry_after=None):
+        """
+        Report how a request went, adjusting the rate and the circuit
+
+        Args:
+            outcome (str): OK, THROTTLED or ERROR
+            retry_after (float): Seconds the site asked us to wait, if any
+        """
+        with self.lock:
+            now = time.monotonic()
+
+            if outcome == OK:
+                self.failures = 0
+                if self.state == "half_open":
+                    print("Requests are going through again")
+                    self.state = "closed"
+                    self.cooldown = self.base_cooldown
+                self._set_rate(self.rate + self.increase)
+                return
+
+            # Requests made before the circuit opened are still reporting back;
+            # they must not reopen it, which would push the pause out and double
+            # the next cooldown once per request
+            if self.state == "open":
+                if retry_after:
+                    self.opened_until = max(self.opened_until, now + retry_after)
+                return
+
+            self.failures += 1
+            if outcome == THROTTLED:
+                self._set_rate(self.rate * self.decrease)
+
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self._open(now)
+            if retry_after:
+                self.opened_until = max(self.opened_until, now + retry_after)
+                if self.state == "closed":
+                    self.paused_until = max(self.paused_until, now + retry_after)
+                    self.tokens = 0.0
+                    self.updated = self.paused_until
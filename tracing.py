@@ -0,0 +1,227 @@
+import itertools
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+
+class Span:
+    def __init__(self, span_id: int, name: str, parent, attrs: dict):
+        """
+        One timed stage of a scan, e.g. a Gemini request or a Vivino page fetch
+
+        Args:
+            span_id (int): Id of the span, unique within its tracer
+            name (str): Stage name, e.g. "gemini.request"
+            parent (int): Id of the span this one was opened inside, if any
+            attrs (dict): Details such as the page number or URL
+        """
+        self.id = span_id
+        self.name = name
+        self.parent = parent
+        self.attrs = dict(attrs)
+        self.counters = {}
+        self.error = None
+        self.thread = threading.current_thread().name
+        self.started = time.time()
+        self.perf_start = time.perf_counter()
+        self.seconds = None
+
+    def count(self, name: str, n: int = 1):
+        """Add n to a counter such as retries, failures, cache_hits or bytes"""
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def set(self, **attrs):
+        """Add details to the span"""
+        self.attrs.update(attrs)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "parent": self.parent,
+            "thread": self.thread,
+            "started": round(self.started, 6),
+            "ms": round(self.seconds * 1000, 3) if self.seconds is not None else None,
+            "attrs": self.attrs,
+            "counters": self.counters,
+            "error": self.error,
+        }
+
+
+class Tracer:
+    def __init__(self, max_spans: int = 100000):
+        """
+        Collects timing spans from every thread of a scan
+
+        Spans opened inside another span on the same thread record it as their
+        parent. Only the latest max_spans finished spans are kept.
+
+        Args:
+            max_spans (int): Number of finished spans to keep
+        """
+        self.spans = deque(maxlen=max_spans)
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.ids = itertools.count(1)
+
+    def _stack(self):
+        if not hasattr(self.local, "stack"):
+            self.local.stack = []
+        return self.local.stack
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        """
+        Time the code inside the with block as a span
+
+        Args:
+            name (str): Stage name
+            attrs: Details to record with the span
+
+        Yields:
+            Span: The open span, for adding counters and details
+        """
+        stack = self._stack()
+        span = Span(next(self.ids), name, stack[-1].id if stack else None, attrs)
+        stack.append(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {str(e)}"
+            raise
+        finally:
+            span.seconds = time.perf_counter() - span.perf_start
+            stack.pop()
+            with self.lock:
+                self.spans.append(span)
+
+    def record(self, name: str, perf_start: float, counters=None, error=None, **attrs):
+        """
+        Add a span timed by the caller, e.g. one that stays open across a generator's
+        yields, where a with block would leave it open in the consumer's code
+
+        Args:
+            name (str): Stage name
+            perf_start (float): time.perf_counter() when the stage started
+            counters (dict): Counters to record with the span
+            error (str): Error that ended the stage, if any
+            attrs: Details to record with the span
+        """
+        span = Span(next(self.ids), name, None, attrs)
+        span.started -= span.perf_start - perf_start
+        span.seconds = span.perf_start - perf_start
+        span.counters = dict(counters or {})
+        span.error = error
+        with self.lock:
+            self.spans.append(span)
+
+    def count(self, name: str, n: int = 1):
+        """Add n to a counter on the innermost open span of this thread, if any"""
+        stack = self._stack()
+        if stack:
+            stack[-1].count(name, n)
+
+    def finished(self):
+        """Copy of the finished spans, oldest first"""
+        with self.lock:
+            return list(self.spans)
+
+    def summary(self):
+        """
+        Totals per stage: calls, errors, total and mean seconds, p95 and counters
+
+        Returns:
+            list: One dict per stage name, slowest total first
+        """
+        stages = {}
+        for span in self.finished():
+            stage = stages.setdefault(
+                span.name, {"durations": [], "errors": 0, "counters": {}}
+            )
+            stage["durations"].append(span.seconds)
+            stage["errors"] += span.error is not None
+            for name, value in span.counters.items():
+                stage["counters"][name] = stage["counters"].get(name, 0) + value
+
+        rows = []
+        for name, stage in stages.items():
+            durations = sorted(stage["durations"])
+            p95 = durations[max(0, round(0.95 * len(durations)) - 1)]
+            rows.append(
+                {
+                    "stage": name,
+                    "calls": len(durations),
+                    "errors": stage["errors"],
+                    "total_s": round(sum(durations), 3),
+                    "mean_ms": round(sum(durations) / len(durations) * 1000, 1),
+                    "p95_ms": round(p95 * 1000, 1),
+                    **stage["counters"],
+                }
+            )
+        return sorted(rows, key=lambda row: row["total_s"], reverse=True)
+
+    def to_jsonl(self):
+        """Finished spans as JSON lines"""
+        lines = [json.dumps(span.to_dict(), default=str) for span in self.finished()]
+        return "".join(line + "\n" for line in lines)
+
+    def export_jsonl(self, path: str):
+        """
+        Write the finished spans to a JSON lines file
+
+        Args:
+            path (str): Output file; it is replaced if it exists
+
+        Returns:
+            int: Number of spans written
+        """
+        text = self.to_jsonl()
+        with open(path, "w") as f:
+            f.write(text)
+        return text.count("\n")
+
+    def clear(self):
+        """Forget the finished spans"""
+        with self.lock:
+            self.spans.clear()
+
+
+_tracer = Tracer()
+
+
+def get_tracer():
+    """Return the shared tracer"""
+    return _tracer
+
+
+def set_tracer(tracer):
+    """Replace the shared tracer, e.g. with a fresh one per batch run"""
+    global _tracer
+    _tracer = tracer
+
+
+def span(name: str, **attrs):
+    """Open a span on the shared tracer; see Tracer.span"""
+    return get_tracer().span(name, **attrs)
+
+
+def count(name: str, n: int = 1):
+    """Add to a counter on the innermost open span; see Tracer.count"""
+    get_tracer().count(name, n)
+
+
+def traced(name: str):
+    """Decorator that runs every call of the function inside a span"""
+
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorate